@@ -0,0 +1,153 @@
+"""
+Per-tenant admission control for the API.
+
+Each tenant gets a token bucket refilled at its weighted share of the base rate;
+a global bucket caps what the API hands to the workers in total. Requests that
+find no token are rejected with a Retry-After hint instead of being queued
+behind everyone else.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import metrics
+from queues import PRIORITY_STEPS
+
+
+class TokenBucket:
+    """Token bucket holding up to `burst` tokens, refilled at `rate` tokens per second."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        """Seconds until `cost` tokens are available (0.0 if they are now)."""
+        self._refill(now)
+        if self.tokens >= cost:
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (cost - self.tokens) / self.rate
+
+    def take(self, cost: float):
+        self.tokens -= cost
+
+    def give_back(self, cost: float):
+        self.tokens = min(self.burst, self.tokens + cost)
+
+    def fill(self) -> float:
+        """Fraction of the bucket currently available."""
+        return self.tokens / self.burst if self.burst else 0.0
+
+
+class TenantAdmission:
+    """
+    Token buckets per tenant (weighted by TENANT_WEIGHTS) plus an optional global bucket.
+    Buckets for idle tenants are evicted LRU beyond max_tenants; an evicted tenant
+    comes back with a full bucket, which is what it would have refilled to anyway.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        weights: Optional[Dict[str, float]] = None,
+        global_rate: float = 0.0,
+        global_burst: float = 0.0,
+        max_tenants: int = 10000
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.weights = weights or {}
+        self.max_tenants = max_tenants
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._global = (
+            TokenBucket(global_rate, global_burst or global_rate, time.monotonic()) if global_rate > 0 else None
+        )
+        self._lock = threading.Lock()
+        self.counters = {"admitted": 0, "rejected_tenant": 0, "rejected_global": 0, "refunded": 0}
+
+    def _bucket(self, tenant: str, now: float) -> TokenBucket:
+        bucket = self._buckets.get(tenant)
+        if bucket is None:
+            weight = self.weights.get(tenant, 1.0)
+            bucket = TokenBucket(self.rate * weight, max(self.burst * weight, 1.0), now)
+            self._buckets[tenant] = bucket
+            if len(self._buckets) > self.max_tenants:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(tenant)
+        return bucket
+
+    def admit(self, tenant: str, cost: float = 1.0) -> float:
+        """
+        Takes `cost` tokens from the tenant's and the global bucket.
+        Returns 0.0 when admitted, otherwise the seconds to wait before retrying.
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._bucket(tenant, now)
+            # A request larger than the bucket could never be admitted; charge a full bucket instead
+            tenant_cost = min(cost, bucket.burst)
+            wait = bucket.wait_time(tenant_cost, now)
+            if wait > 0:
+                self.counters["rejected_tenant"] += 1
+                metrics.ADMISSION_REJECTED.labels(reason="tenant").inc()
+                return wait
+            if self._global is not None:
+                global_cost = min(cost, self._global.burst)
+                wait = self._global.wait_time(global_cost, now)
+                if wait > 0:
+                    self.counters["rejected_global"] += 1
+                    metrics.ADMISSION_REJECTED.labels(reason="global").inc()
+                    return wait
+                self._global.take(global_cost)
+            bucket.take(tenant_cost)
+            self.counters["admitted"] += 1
+            return 0.0
+
+    def refund(self, tenant: str, cost: float = 1.0):
+        """Returns the tokens of an admitted request that was turned away later (e.g. shed)."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            bucket = self._buckets.get(tenant)
+            if bucket is not None:
+                bucket.give_back(min(cost, bucket.burst))
+            if self._global is not None:
+                self._global.give_back(min(cost, self._global.burst))
+            self.counters["admitted"] -= 1
+            self.counters["refunded"] += 1
+
+    def priority(self, tenant: str) -> int:
+        """
+        Broker priority for a tenant's next task: tenants that still have most of
+        their bucket are within their fair share and are served first.
+        """
+        if self.rate <= 0:
+            return PRIORITY_STEPS[0]
+        with self._lock:
+            bucket = self._buckets.get(tenant)
+            fill = bucket.fill() if bucket is not None else 1.0
+        if fill >= 0.5:
+            return PRIORITY_STEPS[0]
+        if fill >= 0.25:
+            return PRIORITY_STEPS[1]
+        return PRIORITY_STEPS[2]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.counters, "tenants": len(self._buckets)}
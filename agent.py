@@ -11,10 +11,18 @@ Uses Google Gemini API for enhanced reasoning (optional).
 """
 
 import os
-from typing import TypedDict, List, Dict, Any
-from langgraph.graph import StateGraph, END
-# import rag_service
-import rag_service_mock as rag_service  # Use mock for quick testing
+import logging
+import threading
+from typing import TypedDict, List, Dict, Any, Callable, Iterator, Optional, Tuple, TYPE_CHECKING
+import retrieval
+from metrics import timed_node
+from prerequisites import get_graph as get_prerequisite_graph
+from timeline import compile_timeline
+
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
+
+logger = logging.getLogger(__name__)
 
 
 class RoadmapState(TypedDict):
@@ -27,115 +35,107 @@ class RoadmapState(TypedDict):
     roadmap: List[Dict[str, Any]]
 
 
+@timed_node("retrieve_resources")
 def retrieve_resources_node(state: RoadmapState) -> RoadmapState:
     """
-    Node 1: Retrieve relevant resources using LlamaIndex RAG.
+    Node 1: Retrieve relevant resources from the configured retrievers (RETRIEVAL_SOURCES).
+    Queries for the goal, each missing prerequisite and the learner's current skills
+    run concurrently and are fused by reciprocal rank (see retrieval.py).
+    Skipped when resources were already retrieved (e.g. by a batched query).
     """
-    print(f"[Agent] Retrieving resources for goal: {state['goal']}")
-    resources = rag_service.query_resources(state['goal'])
-    state['retrieved_resources'] = resources
+    if state['retrieved_resources']:
+        return state
+    logger.debug("Retrieving resources for goal: %s", state['goal'])
+    state['retrieved_resources'] = retrieve_resources(state['goal'], state['current_skills'])
     return state
 
 
+def _missing_prerequisite_names(goal: str, current_skills: List[str]) -> List[str]:
+    graph = get_prerequisite_graph()
+    return [graph.names[i] for i in graph.missing_prerequisites(goal, current_skills) or []]
+
+
+def retrieve_resources(goal: str, current_skills: List[str]) -> List[Dict[str, Any]]:
+    """Fan-out retrieval for a goal and the learner's missing prerequisites."""
+    return retrieval.retrieve(goal, current_skills, _missing_prerequisite_names(goal, current_skills))
+
+
+def retrieve_resources_batch(requests: List[Tuple[str, List[str]]]) -> List[List[Dict[str, Any]]]:
+    """retrieve_resources for several (goal, current_skills) at once, batching the retriever calls."""
+    return retrieval.retrieve_batch([
+        (goal, current_skills, _missing_prerequisite_names(goal, current_skills)) for goal, current_skills in requests
+    ])
+
+
+@timed_node("reason_prerequisites")
 def reason_prerequisites_node(state: RoadmapState) -> RoadmapState:
     """
     Node 2: Determine learning prerequisites and ordering.
-    Uses simple rule-based reasoning (can be enhanced with LLM later).
+    Walks the prerequisite graph (see prerequisites.py) for the goal and spreads the
+    missing prerequisites, in topological order, over week_1 and week_2 (the
+    foundation weeks of the timeline template).
     """
-    print("[Agent] Reasoning about prerequisites and learning order")
+    logger.debug("Reasoning about prerequisites and learning order")
     
-    goal = state['goal'].lower()
-    current_skills = [s.lower() for s in state['current_skills']]
+    graph = get_prerequisite_graph()
+    goal = state['goal']
+    missing = graph.missing_prerequisites(goal, state['current_skills'])
     
-    # Simple prerequisite reasoning based on common patterns
     prerequisites = {}
     
-    if 'react' in goal:
-        if 'html' not in current_skills and 'css' not in current_skills:
-            prerequisites['week_1'] = "Learn HTML/CSS first - React builds on web fundamentals"
-        elif 'javascript' not in current_skills:
-            prerequisites['week_1'] = "Learn JavaScript basics - React is a JavaScript library"
-        else:
-            prerequisites['week_1'] = "Review JavaScript ES6+ features before diving into React"
-    
-    elif 'saas' in goal or 'mern' in goal:
-        if 'javascript' not in current_skills:
-            prerequisites['week_1'] = "Master JavaScript fundamentals - required for full-stack development"
-        elif 'react' not in current_skills:
-            prerequisites['week_2'] = "Learn React for the frontend before backend integration"
-        else:
-            prerequisites['week_1'] = "Review full-stack architecture patterns"
-    
-    elif 'javascript' in goal:
-        if 'html' not in current_skills:
-            prerequisites['week_1'] = "Learn HTML basics to understand the DOM that JavaScript manipulates"
-        else:
-            prerequisites['week_1'] = "Start with ES6+ syntax and modern JavaScript features"
-    
+    if missing is None:
+        prerequisites['week_1'] = f"Build foundational knowledge in {goal} step by step"
+    elif missing:
+        # Earlier prerequisites go first; week_1 takes the larger half of an odd count
+        split = (len(missing) + 1) // 2
+        for week, topic_ids in enumerate([missing[:split], missing[split:]], start=1):
+            if topic_ids:
+                names = " and ".join(graph.names[i] for i in topic_ids)
+                whys = "; ".join(f"{graph.names[i]}: {graph.whys[i]}" if len(topic_ids) > 1 else graph.whys[i]
+                                 for i in topic_ids)
+                prerequisites[f'week_{week}'] = f"Learn {names} first - {whys}"
     else:
-        prerequisites['week_1'] = f"Build foundational knowledge in {state['goal']} step by step"
+        direct = ", ".join(graph.names[i] for i in graph.direct_prerequisites(goal))
+        if direct:
+            prerequisites['week_1'] = f"Review {direct} before diving into {goal}"
+        else:
+            prerequisites['week_1'] = f"Start with the core concepts of {goal}"
     
     state['prerequisites'] = prerequisites
     return state
 
 
+@timed_node("generate_timeline")
 def generate_timeline_node(state: RoadmapState) -> RoadmapState:
     """
     Node 3: Generate the final structured weekly roadmap.
+    Each week is also written to the graph's custom stream as soon as it is built
+    (a no-op unless the graph is streamed with the "custom" mode).
     """
-    print("[Agent] Generating structured timeline")
-    
-    duration = state['duration_weeks']
-    resources = state['retrieved_resources']
-    prerequisites = state['prerequisites']
-    goal = state['goal']
-    
-    # Format resources
-    resource_strings = [f"{r['title']}: {r['snippet']}" for r in resources]
+    from langgraph.config import get_stream_writer
+
+    logger.debug("Generating structured timeline")
     
+    # Week strings and resource lists come from a cached, precompiled template
+    template = compile_timeline(state['goal'], state['retrieved_resources'], state['prerequisites'])
+    write = get_stream_writer()
     roadmap = []
-    for week_num in range(1, duration + 1):
-        # Determine topic and reasoning
-        if week_num == 1:
-            topic = "Foundations & Setup"
-            desc = f"Setting up the environment for {goal} and learning core concepts."
-            why_first = prerequisites.get('week_1', "Establishing a strong foundation is crucial before advancing.")
-            week_resources = resource_strings[:2] if resource_strings else ["Getting Started Guide"]
-        
-        elif week_num == 2 and duration > 2:
-            topic = "Core Concepts"
-            desc = f"Deep dive into the essential concepts of {goal}."
-            why_first = prerequisites.get('week_2', "Building on the foundation with practical knowledge.")
-            week_resources = resource_strings[2:4] if len(resource_strings) > 2 else ["Core Documentation", "Practice Exercises"]
-        
-        elif week_num == duration:
-            topic = "Final Project & Review"
-            desc = f"Building a capstone project to demonstrate {goal} mastery."
-            why_first = "Applying knowledge through a real project solidifies learning and builds portfolio."
-            week_resources = ["Project Guide", "Deployment Checklist", "Best Practices"]
-        
-        else:
-            topic = f"Advanced Topics (Week {week_num})"
-            desc = f"Exploring advanced features and patterns in {goal}."
-            why_first = "Progressive learning - each concept builds on previous knowledge."
-            week_resources = resource_strings[-2:] if resource_strings else ["Advanced Tutorial", "Case Studies"]
-        
-        roadmap.append({
-            "week_number": week_num,
-            "topic": topic,
-            "description": desc,
-            "resources": week_resources,
-            "why_first": why_first
-        })
+    for week in template.iter_weeks(state['duration_weeks']):
+        roadmap.append(week)
+        write({"week": week})
     
     state['roadmap'] = roadmap
     return state
 
 
-def create_roadmap_graph() -> StateGraph:
+def create_roadmap_graph() -> "StateGraph":
     """
     Creates and compiles the LangGraph workflow.
+    LangGraph is imported here rather than at module level: it takes most of a
+    second to import and processes that never run the agent shouldn't pay for it.
     """
+    from langgraph.graph import StateGraph, END
+
     workflow = StateGraph(RoadmapState)
     
     # Add nodes
@@ -152,30 +152,141 @@ def create_roadmap_graph() -> StateGraph:
     return workflow.compile()
 
 
-def generate_roadmap_with_agent(goal: str, duration_weeks: int, current_skills: List[str]) -> Dict[str, Any]:
+# --- Compiled graph registry ---
+# Compiling the StateGraph is pure overhead once the node set is fixed, so each
+# worker process compiles every registered workflow version once and reuses it.
+
+WORKFLOW_VERSION = os.getenv("ROADMAP_WORKFLOW_VERSION", "v1")
+
+_workflow_builders: Dict[str, Callable[[], Any]] = {
+    "v1": create_roadmap_graph,
+}
+_compiled_graphs: Dict[str, Any] = {}
+_active_version = WORKFLOW_VERSION
+_registry_lock = threading.Lock()
+
+
+def register_workflow(version: str, builder: Callable[[], Any], activate: bool = False):
     """
-    Main function to generate a roadmap using the LangGraph agent.
+    Registers (or replaces) a workflow builder and compiles it immediately.
+    With activate=True new invocations switch to this version without a worker restart.
     """
-    print(f"\n=== Starting LangGraph Agent ===")
-    print(f"Goal: {goal}, Duration: {duration_weeks} weeks, Skills: {current_skills}")
-    
-    # Initialize state
-    initial_state: RoadmapState = {
+    global _active_version
+    compiled = builder()
+    with _registry_lock:
+        _workflow_builders[version] = builder
+        _compiled_graphs[version] = compiled
+        if activate:
+            _active_version = version
+
+
+def set_active_workflow(version: str):
+    """Switches the workflow version used by generate_roadmap_with_agent."""
+    global _active_version
+    if version not in _workflow_builders:
+        raise KeyError(f"Unknown workflow version: {version}")
+    _active_version = version
+
+
+def get_compiled_graph(version: Optional[str] = None):
+    """
+    Returns the compiled graph for a workflow version, compiling it on first use.
+    """
+    version = version or _active_version
+    graph = _compiled_graphs.get(version)
+    if graph is not None:
+        return graph
+    with _registry_lock:
+        if version not in _compiled_graphs:
+            if version not in _workflow_builders:
+                raise KeyError(f"Unknown workflow version: {version}")
+            _compiled_graphs[version] = _workflow_builders[version]()
+        return _compiled_graphs[version]
+
+
+def warm_graph_registry():
+    """
+    Compiles every registered workflow version. Workers call it in the parent
+    before forking (children inherit the compiled graphs) and again per child,
+    which is then a no-op.
+    """
+    for version in list(_workflow_builders):
+        get_compiled_graph(version)
+    logger.info("Compiled workflow versions: %s (active: %s)", sorted(_compiled_graphs), _active_version)
+
+
+def _initial_state(
+    goal: str,
+    duration_weeks: int,
+    current_skills: List[str],
+    retrieved_resources: Optional[List[Dict[str, Any]]]
+) -> RoadmapState:
+    return {
         "goal": goal,
         "current_skills": current_skills,
         "duration_weeks": duration_weeks,
-        "retrieved_resources": [],
+        "retrieved_resources": retrieved_resources or [],
         "prerequisites": {},
         "roadmap": []
     }
+
+
+def stream_roadmap_with_agent(
+    goal: str,
+    duration_weeks: int,
+    current_skills: List[str],
+    retrieved_resources: Optional[List[Dict[str, Any]]] = None
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Streaming execution of the agent. Yields, as they happen:
+    ("node", (node_name, state)) when a node completes, with the state so far;
+    ("week", week) for each roadmap week generate_timeline builds;
+    ("result", result) once at the end, as returned by generate_roadmap_with_agent.
+    """
+    logger.debug("Streaming LangGraph agent: goal=%s, duration=%s weeks", goal, duration_weeks)
+    state = dict(_initial_state(goal, duration_weeks, current_skills, retrieved_resources))
+    graph = get_compiled_graph()
+    for mode, chunk in graph.stream(state, stream_mode=["updates", "custom"]):
+        if mode == "custom":
+            if "week" in chunk:
+                yield "week", chunk["week"]
+            continue
+        for node_name, node_state in chunk.items():
+            state.update(node_state)
+            yield "node", (node_name, state)
+    yield "result", {"roadmap": state["roadmap"], "total_weeks": duration_weeks}
+
+
+def generate_roadmap_with_agent(
+    goal: str,
+    duration_weeks: int,
+    current_skills: List[str],
+    progress_callback: Optional[Callable[[str, RoadmapState], None]] = None,
+    retrieved_resources: Optional[List[Dict[str, Any]]] = None,
+    week_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Main function to generate a roadmap using the LangGraph agent.
+    If progress_callback is given, it is called with (node_name, state) as each node completes;
+    week_callback is called with each roadmap week as soon as it is built.
+    Passing retrieved_resources skips the retrieval step.
+    """
+    if progress_callback is None and week_callback is None:
+        logger.debug("Starting LangGraph agent: goal=%s, duration=%s weeks, skills=%s", goal, duration_weeks, current_skills)
+        # Run the pre-compiled graph for the active workflow version
+        final_state = get_compiled_graph().invoke(
+            _initial_state(goal, duration_weeks, current_skills, retrieved_resources)
+        )
+        logger.debug("Agent complete")
+        return {
+            "roadmap": final_state["roadmap"],
+            "total_weeks": duration_weeks
+        }
     
-    # Create and run the graph
-    graph = create_roadmap_graph()
-    final_state = graph.invoke(initial_state)
-    
-    print("=== Agent Complete ===\n")
-    
-    return {
-        "roadmap": final_state["roadmap"],
-        "total_weeks": duration_weeks
-    }
+    for kind, payload in stream_roadmap_with_agent(goal, duration_weeks, current_skills, retrieved_resources):
+        if kind == "node" and progress_callback is not None:
+            progress_callback(*payload)
+        elif kind == "week" and week_callback is not None:
+            week_callback(payload)
+        elif kind == "result":
+            return payload
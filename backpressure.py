@@ -0,0 +1,438 @@
+"""
+Queue-depth signals and adaptive backpressure.
+
+SignalSampler runs as its own process (`python backpressure.py`). Every few
+seconds it reads each queue's length and head-of-line age from the Redis
+broker, pool sizes through Celery's inspect, and task runtimes and worker
+activity from Celery events. From those it estimates how long a task
+published now would wait. The snapshot is stored in Redis for the API and
+exported as Prometheus gauges, including the worker concurrency needed to
+drain the backlog within the target wait (a scaling signal).
+
+AdaptiveAdmission runs in the API. While a queue's estimated wait stays
+under its target, every request is admitted. Above the target (or while
+deferred work waits past the maximum), the share of requests admitted at
+their normal priority shrinks multiplicatively with each new snapshot and
+grows back additively once the wait recovers (AIMD).
+The remaining requests are deferred to the lowest broker priority, behind
+in-target work, unless the deferred backlog's own wait is past the queue's
+maximum: then they are shed.
+"""
+
+import math
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+import metrics
+import queues
+
+SIGNALS_KEY = "roadmap:signals"
+# kombu's Redis transport keeps one list per priority step: "<queue>" for 0, "<queue>\x06\x16<step>" above
+PRIORITY_SEP = "\x06\x16"
+
+SAMPLE_INTERVAL = float(os.getenv("BACKPRESSURE_SAMPLE_INTERVAL", "2"))
+INSPECT_INTERVAL = float(os.getenv("BACKPRESSURE_INSPECT_INTERVAL", "15"))
+METRICS_PORT = int(os.getenv("BACKPRESSURE_METRICS_PORT", "9809"))
+# Assumed task runtime per queue until task events have been observed
+DEFAULT_RUNTIME = queues.parse_weights(
+    os.getenv("BACKPRESSURE_DEFAULT_RUNTIME", "interactive=2,bulk=30,maintenance=10")
+)
+TARGET_WAIT = queues.parse_weights(os.getenv("BACKPRESSURE_TARGET_WAIT", "interactive=10,bulk=300"))
+MAX_WAIT = queues.parse_weights(os.getenv("BACKPRESSURE_MAX_WAIT", "interactive=60,bulk=1800"))
+
+ADMIT = "admit"
+DEFER = "defer"
+SHED = "shed"
+
+ALL_QUEUES = [queues.INTERACTIVE_QUEUE, queues.BULK_QUEUE, queues.MAINTENANCE_QUEUE]
+
+
+def queue_for_task(task_name: str) -> str:
+    return queues.TASK_ROUTES.get(task_name, {}).get("queue", queues.INTERACTIVE_QUEUE)
+
+
+def broker_lists(queue: str) -> List[str]:
+    """The Redis lists holding a queue's messages, highest priority first."""
+    return [queue if step == 0 else f"{queue}{PRIORITY_SEP}{step}" for step in queues.PRIORITY_STEPS]
+
+
+def estimate_wait(
+    depths: Dict[str, int],
+    runtimes: Dict[str, float],
+    concurrency: int,
+    weights: Optional[Dict[str, float]] = None
+) -> Dict[str, float]:
+    """
+    Seconds a task published now would wait in each queue: the queue's backlog
+    of work divided by the pool slots it gets. Workers poll queues by weight
+    (see queues.WeightedQueueCycle), so a queue gets its weighted share of the
+    slots among the queues that have work.
+    """
+    weights = weights if weights is not None else queues.QUEUE_WEIGHTS
+    busy = [q for q, depth in depths.items() if depth > 0]
+    total_weight = sum(weights.get(q, 1.0) for q in busy)
+    waits = {}
+    for queue, depth in depths.items():
+        if depth <= 0:
+            waits[queue] = 0.0
+            continue
+        slots = concurrency * weights.get(queue, 1.0) / total_weight if total_weight else 0.0
+        waits[queue] = depth * runtimes[queue] / slots if slots > 0 else math.inf
+    return waits
+
+
+def desired_concurrency(
+    depths: Dict[str, int],
+    runtimes: Dict[str, float],
+    active: int,
+    target_wait: Dict[str, float]
+) -> int:
+    """Pool slots needed to keep the running tasks and drain each backlog within its target wait."""
+    backlog_slots = sum(
+        depth * runtimes[queue] / target_wait[queue]
+        for queue, depth in depths.items() if depth > 0 and target_wait.get(queue)
+    )
+    return max(math.ceil(active + backlog_slots), 1)
+
+
+class SignalSampler:
+    """
+    Samples the broker and the workers and publishes a snapshot to SIGNALS_KEY.
+    The key expires after a few missed samples, so consumers never act on stale signals.
+    """
+
+    def __init__(
+        self,
+        celery_app,
+        broker_client_factory: Callable[[], Any],
+        signals_client_factory: Callable[[], Any],
+        sample_interval: float = SAMPLE_INTERVAL,
+        inspect_interval: float = INSPECT_INTERVAL
+    ):
+        self.app = celery_app
+        self._broker_client_factory = broker_client_factory
+        self._signals_client_factory = signals_client_factory
+        self.sample_interval = sample_interval
+        self.inspect_interval = inspect_interval
+        self.runtimes: Dict[str, float] = {q: DEFAULT_RUNTIME.get(q, 1.0) for q in ALL_QUEUES}
+        # hostname -> pool size (from inspect) and active tasks (from worker heartbeats)
+        self._concurrency: Dict[str, int] = {}
+        self._active: Dict[str, int] = {}
+        self._inspected_at = float("-inf")
+        # task id -> queue, from task-received events (task-succeeded doesn't carry the name)
+        self._task_queues: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._receiver = None
+
+    # --- Celery events ---
+
+    def _on_received(self, event: Dict[str, Any]):
+        with self._lock:
+            self._task_queues[event["uuid"]] = queue_for_task(event.get("name", ""))
+            if len(self._task_queues) > 10000:
+                self._task_queues.popitem(last=False)
+
+    def _on_finished(self, event: Dict[str, Any]):
+        with self._lock:
+            queue = self._task_queues.pop(event["uuid"], None)
+            runtime = event.get("runtime")
+            if queue is not None and runtime is not None:
+                # Exponentially weighted, so the estimate follows changes in task mix
+                self.runtimes[queue] = 0.8 * self.runtimes[queue] + 0.2 * float(runtime)
+
+    def _on_heartbeat(self, event: Dict[str, Any]):
+        with self._lock:
+            self._active[event["hostname"]] = int(event.get("active", 0))
+
+    def _on_offline(self, event: Dict[str, Any]):
+        with self._lock:
+            self._active.pop(event["hostname"], None)
+            self._concurrency.pop(event["hostname"], None)
+
+    def capture_events(self):
+        """Consumes Celery events until stop(); reconnects on errors. Task events need workers run with -E."""
+        handlers = {
+            "task-received": self._on_received,
+            "task-succeeded": self._on_finished,
+            "task-failed": self._on_finished,
+            "worker-heartbeat": self._on_heartbeat,
+            "worker-offline": self._on_offline,
+        }
+        while not self._stopped.is_set():
+            try:
+                with self.app.connection_for_read() as connection:
+                    self._receiver = self.app.events.Receiver(connection, handlers=handlers)
+                    self._receiver.should_stop = self._stopped.is_set()
+                    self._receiver.capture(limit=None, timeout=None, wakeup=True)
+            except Exception as e:
+                print(f"[Backpressure] Event capture failed, reconnecting: {e}")
+                self._stopped.wait(5)
+
+    # --- Sampling ---
+
+    def _inspect(self):
+        """Pool sizes per worker. A broadcast round trip, so only every inspect_interval."""
+        now = time.monotonic()
+        if now - self._inspected_at < self.inspect_interval:
+            return
+        self._inspected_at = now
+        try:
+            stats = self.app.control.inspect(timeout=1.0).stats() or {}
+        except Exception as e:
+            print(f"[Backpressure] Inspect failed: {e}")
+            return
+        concurrency = {
+            hostname: int(info.get("pool", {}).get("max-concurrency", 0)) for hostname, info in stats.items()
+        }
+        with self._lock:
+            self._concurrency = concurrency
+            self._active = {h: n for h, n in self._active.items() if h in concurrency}
+
+    def _read_queues(self) -> Tuple[Dict[str, int], Dict[str, int], Dict[str, float], Dict[str, float]]:
+        """
+        Length and head-of-line age of every queue, and of its lowest (deferred)
+        priority band, in one pipeline.
+        """
+        client = self._broker_client_factory()
+        pipe = client.pipeline(transaction=False)
+        for queue in ALL_QUEUES:
+            for name in broker_lists(queue):
+                pipe.llen(name)
+                # Messages are LPUSHed and BRPOPed: the oldest is at the tail
+                pipe.lindex(name, -1)
+        replies = iter(pipe.execute())
+        now = time.time()
+        depths: Dict[str, int] = {}
+        deferred: Dict[str, int] = {}
+        ages: Dict[str, float] = {}
+        deferred_ages: Dict[str, float] = {}
+        for queue in ALL_QUEUES:
+            depths[queue], ages[queue] = 0, 0.0
+            for _ in broker_lists(queue):
+                length, oldest = int(next(replies) or 0), next(replies)
+                age = 0.0
+                if oldest is not None:
+                    try:
+                        enqueued_at = orjson.loads(oldest).get("headers", {}).get("enqueued_at")
+                    except orjson.JSONDecodeError:
+                        enqueued_at = None
+                    if enqueued_at is not None:
+                        age = max(now - float(enqueued_at), 0.0)
+                depths[queue] += length
+                ages[queue] = max(ages[queue], age)
+                # The last list is the lowest priority band
+                deferred[queue], deferred_ages[queue] = length, age
+        return depths, deferred, ages, deferred_ages
+
+    def sample(self) -> Dict[str, Any]:
+        self._inspect()
+        depths, deferred, ages, deferred_ages = self._read_queues()
+        with self._lock:
+            runtimes = dict(self.runtimes)
+            concurrency = sum(self._concurrency.values())
+            active = sum(self._active.values())
+        # Tasks at normal priority are served before the deferred band, so they only wait behind the rest.
+        # Deferred tasks also wait for normal ones published after them, which only their measured age shows.
+        waits = estimate_wait({q: depths[q] - deferred[q] for q in depths}, runtimes, concurrency)
+        deferred_waits = estimate_wait(depths, runtimes, concurrency)
+        deferred_waits = {q: max(wait, deferred_ages[q]) for q, wait in deferred_waits.items()}
+        return {
+            "sampled_at": time.time(),
+            "workers": len(self._concurrency),
+            "concurrency": concurrency,
+            "active": active,
+            "utilization": min(active / concurrency, 1.0) if concurrency else 0.0,
+            "desired_concurrency": desired_concurrency(depths, runtimes, active, TARGET_WAIT),
+            "queues": {
+                queue: {
+                    "depth": depths[queue],
+                    "deferred_depth": deferred[queue],
+                    "oldest_age": ages[queue],
+                    "mean_runtime": runtimes[queue],
+                    "estimated_wait": waits[queue],
+                    "deferred_wait": deferred_waits[queue]
+                }
+                for queue in ALL_QUEUES
+            }
+        }
+
+    def publish(self, snapshot: Dict[str, Any]):
+        ttl = max(math.ceil(self.sample_interval * 3), 10)
+        # orjson writes an infinite wait (work queued, no workers) as null
+        self._signals_client_factory().set(SIGNALS_KEY, orjson.dumps(snapshot), ex=ttl)
+        for queue, signal in snapshot["queues"].items():
+            metrics.QUEUE_DEPTH.labels(queue=queue).set(signal["depth"])
+            metrics.QUEUE_OLDEST_AGE.labels(queue=queue).set(signal["oldest_age"])
+            metrics.QUEUE_ESTIMATED_WAIT.labels(queue=queue, priority="normal").set(signal["estimated_wait"])
+            metrics.QUEUE_ESTIMATED_WAIT.labels(queue=queue, priority="deferred").set(signal["deferred_wait"])
+        metrics.WORKER_UTILIZATION.set(snapshot["utilization"])
+        metrics.WORKER_DESIRED_CONCURRENCY.set(snapshot["desired_concurrency"])
+
+    def run(self):
+        """Samples and publishes every sample_interval seconds until stop()."""
+        threading.Thread(target=self.capture_events, name="celery-events", daemon=True).start()
+        while not self._stopped.is_set():
+            started = time.monotonic()
+            try:
+                self.publish(self.sample())
+            except Exception as e:
+                print(f"[Backpressure] Sampling failed: {e}")
+            self._stopped.wait(max(self.sample_interval - (time.monotonic() - started), 0.0))
+
+    def stop(self):
+        self._stopped.set()
+        if self._receiver is not None:
+            self._receiver.should_stop = True
+
+
+class SignalReader:
+    """The latest published snapshot, re-read from Redis at most every refresh_seconds."""
+
+    def __init__(self, redis_client_factory: Callable[[], Any], refresh_seconds: float = 1.0):
+        self._redis_client_factory = redis_client_factory
+        self._redis = None
+        self.refresh_seconds = refresh_seconds
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._checked = float("-inf")
+        self._lock = threading.Lock()
+
+    def _client(self):
+        if self._redis is None:
+            self._redis = self._redis_client_factory()
+        return self._redis
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        # Called from the API's threadpool: one thread refreshes, the others wait for it
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked >= self.refresh_seconds:
+                self._checked = now
+                try:
+                    raw = self._client().get(SIGNALS_KEY)
+                    self._snapshot = orjson.loads(raw) if raw is not None else None
+                except Exception as e:
+                    print(f"[Backpressure] Could not read signals: {e}")
+                    self._snapshot = None
+            return self._snapshot
+
+
+class AdaptiveAdmission:
+    """
+    Admit / defer / shed decisions per queue from the estimated wait (see module
+    docstring). Without signals (no sampler running, or its snapshot expired)
+    every request is admitted.
+    """
+
+    def __init__(
+        self,
+        signals: Callable[[], Optional[Dict[str, Any]]],
+        target_wait: Optional[Dict[str, float]] = None,
+        max_wait: Optional[Dict[str, float]] = None,
+        increase: float = 0.1,
+        decrease: float = 0.5,
+        min_fraction: float = 0.05,
+        rng: Optional[random.Random] = None
+    ):
+        self._signals = signals
+        self.target_wait = target_wait if target_wait is not None else TARGET_WAIT
+        self.max_wait = max_wait if max_wait is not None else MAX_WAIT
+        self.increase = increase
+        self.decrease = decrease
+        self.min_fraction = min_fraction
+        self._rng = rng or random.Random()
+        # Share of requests admitted at normal priority, per queue
+        self.fractions: Dict[str, float] = {}
+        self._observed_at: Optional[float] = None
+        self.counters = {ADMIT: 0, DEFER: 0, SHED: 0}
+        # Decisions run concurrently on the API's threadpool
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _wait(signal: Dict[str, Any], field: str = "estimated_wait") -> float:
+        wait = signal.get(field, signal["estimated_wait"])
+        return math.inf if wait is None else float(wait)
+
+    def observe(self, snapshot: Dict[str, Any]):
+        """AIMD step for every queue with a target, once per snapshot."""
+        with self._lock:
+            self._observe(snapshot)
+
+    def _observe(self, snapshot: Dict[str, Any]):
+        if snapshot["sampled_at"] == self._observed_at:
+            return
+        self._observed_at = snapshot["sampled_at"]
+        for queue, target in self.target_wait.items():
+            signal = snapshot["queues"].get(queue)
+            if signal is None:
+                continue
+            fraction = self.fractions.get(queue, 1.0)
+            # Deferred work is only served from leftover capacity; past max_wait it is starving too
+            over_target = self._wait(signal) > target
+            starving = self._wait(signal, "deferred_wait") > self.max_wait.get(queue, math.inf)
+            if over_target or starving:
+                fraction = max(fraction * self.decrease, self.min_fraction)
+            else:
+                fraction = min(fraction + self.increase, 1.0)
+            self.fractions[queue] = fraction
+
+    def decide(self, queue: str) -> Tuple[str, float]:
+        """
+        (ADMIT, 0.0), (DEFER, estimated wait) or (SHED, seconds until the backlog
+        is back under target). A request that isn't admitted is deferred unless
+        the deferred band's wait is already past the queue's maximum.
+        """
+        snapshot = self._signals()
+        signal = snapshot["queues"].get(queue) if snapshot is not None else None
+        with self._lock:
+            if signal is None:
+                return self._count(queue, ADMIT), 0.0
+            self._observe(snapshot)
+            wait = self._wait(signal)
+            max_wait = self.max_wait.get(queue, math.inf)
+            if wait <= max_wait and self._rng.random() < self.fractions.get(queue, 1.0):
+                return self._count(queue, ADMIT), 0.0
+            deferred_wait = self._wait(signal, "deferred_wait")
+            if deferred_wait <= max_wait:
+                return self._count(queue, DEFER), deferred_wait
+            return self._count(queue, SHED), max(deferred_wait - self.target_wait.get(queue, 0.0), 1.0)
+
+    def _count(self, queue: str, action: str) -> str:
+        # Called with self._lock held
+        self.counters[action] += 1
+        metrics.BACKPRESSURE_DECISIONS.labels(queue=queue, action=action).inc()
+        return action
+
+    def stats(self) -> Dict[str, Any]:
+        signals = self._signals()
+        with self._lock:
+            return {**self.counters, "fractions": dict(self.fractions), "signals": signals}
+
+
+def main():
+    import redis
+
+    import tasks
+
+    broker = redis.Redis.from_url(tasks.CELERY_BROKER_URL)
+    sampler = SignalSampler(
+        tasks.celery_app,
+        broker_client_factory=lambda: broker,
+        signals_client_factory=lambda: tasks.celery_app.backend.client
+    )
+    metrics.start_metrics_server(METRICS_PORT)
+    print(f"[Backpressure] Sampling queues every {sampler.sample_interval:g}s")
+    try:
+        sampler.run()
+    except KeyboardInterrupt:
+        sampler.stop()
+
+
+if __name__ == "__main__":
+    main()
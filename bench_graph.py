@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for LangGraph workflow invocation.
+Compares a cold invocation (build + compile + invoke, the old per-task path)
+against a warm invocation of the pre-compiled graph from the registry.
+"""
+
+import time
+import statistics
+from typing import Callable, List
+
+import agent
+
+
+def make_state(goal: str = "React") -> agent.RoadmapState:
+    """Build an initial state matching generate_roadmap_with_agent."""
+    return {
+        "goal": goal,
+        "current_skills": ["HTML", "CSS"],
+        "duration_weeks": 4,
+        "retrieved_resources": [],
+        "prerequisites": {},
+        "roadmap": []
+    }
+
+
+def time_runs(fn: Callable[[], None], iterations: int) -> List[float]:
+    """Run fn repeatedly and return per-call timings in milliseconds."""
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def cold_invoke():
+    """Old per-task path: build, compile and invoke a fresh graph."""
+    agent.create_roadmap_graph().invoke(make_state())
+
+
+def warm_invoke():
+    """Invoke the graph already compiled in the registry."""
+    agent.get_compiled_graph().invoke(make_state())
+
+
+def report(name: str, timings: List[float]):
+    """Print summary statistics for a set of timings."""
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:<6} mean={statistics.mean(timings):8.3f}ms  "
+          f"p50={statistics.median(timings):8.3f}ms  p95={p95:8.3f}ms")
+
+
+def run_benchmark(iterations: int = 200):
+    """Run cold and warm invocations and print a comparison."""
+    agent.warm_graph_registry()
+    cold = time_runs(cold_invoke, iterations)
+    warm = time_runs(warm_invoke, iterations)
+
+    print(f"\nGraph invocation benchmark ({iterations} iterations)")
+    report("cold", cold)
+    report("warm", warm)
+    print(f"speedup (mean): {statistics.mean(cold) / statistics.mean(warm):.1f}x\n")
+
+
+if __name__ == "__main__":
+    run_benchmark()
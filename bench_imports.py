@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Import-time report for the service entry points.
+Each module is imported in a fresh interpreter under `python -X importtime`,
+so the numbers are what a cold API or worker container pays before serving.
+Also lists which heavy stacks (LangGraph, llama_index, ChromaDB, torch, ...)
+the import pulled in.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+DEFAULT_MODULES = ["main", "tasks", "agent", "rag_service", "rag_service_mock"]
+HEAVY_PACKAGES = ["langgraph", "langchain_core", "llama_index", "chromadb", "torch", "transformers", "numpy"]
+
+# Runs in the child: import the module, then report which heavy packages got loaded
+_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+loaded = [p for p in {heavy!r} if p in sys.modules]
+print(json.dumps({{"seconds": elapsed, "heavy": loaded}}))
+"""
+
+
+def parse_importtime(stderr: str, module: str) -> List[Tuple[str, int]]:
+    """(name, cumulative microseconds) of the imports `module` made directly, from -X importtime output."""
+    children: List[Tuple[str, int]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        # Nesting is shown as two spaces per level; children are printed before their parent
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == module:
+                return children
+            children = []
+        elif depth == 1:
+            children.append((name.strip(), int(cumulative_us)))
+    return children
+
+
+def measure(module: str) -> Dict:
+    """Imports `module` in a fresh interpreter and returns its timings."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD.format(module=module, heavy=HEAVY_PACKAGES)],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if proc.returncode != 0:
+        error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "unknown error"
+        return {"module": module, "error": error}
+    child = json.loads(proc.stdout.strip().splitlines()[-1])
+    direct = parse_importtime(proc.stderr, module)
+    return {
+        "module": module,
+        "seconds": child["seconds"],
+        "heavy": child["heavy"],
+        "slowest": sorted(direct, key=lambda e: e[1], reverse=True)[:5]
+    }
+
+
+def report(results: List[Dict]):
+    """Print one line per module plus its slowest top-level imports."""
+    print(f"\n{'module':<18} {'import':>9}  heavy stacks loaded")
+    for result in results:
+        if "error" in result:
+            print(f"{result['module']:<18} {'failed':>9}  {result['error']}")
+            continue
+        heavy = ", ".join(result["heavy"]) or "-"
+        print(f"{result['module']:<18} {result['seconds'] * 1000:7.1f}ms  {heavy}")
+        for name, cumulative_us in result["slowest"]:
+            print(f"{'':<20}{cumulative_us / 1000:7.1f}ms  {name}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="modules to import")
+    parser.add_argument("--repeat", type=int, default=3, help="imports per module; the median is reported")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for module in args.modules:
+        runs = [measure(module) for _ in range(args.repeat)]
+        ok = [r for r in runs if "error" not in r]
+        if not ok:
+            results.append(runs[0])
+            continue
+        result = sorted(ok, key=lambda r: r["seconds"])[len(ok) // 2]
+        result["seconds"] = statistics.median(r["seconds"] for r in ok)
+        results.append(result)
+
+    report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Load-generation and benchmark harness for the Smart Learning Path Generator.
+
+HTTP mode drives a running API with an async client, either open-loop
+(constant arrival rate; latency is measured from each request's scheduled
+start, so a stalled server can't hide queueing) or closed-loop (a fixed
+number of concurrent users). In-process mode benchmarks
+agent.generate_roadmap_with_agent and the retrievers directly, without Docker.
+
+Latencies are recorded in HDR histograms and reported as p50/p95/p99/p99.9.
+Results can be written as JSON and compared against a previous run.
+
+Examples:
+    python benchmark.py http --mode open --rate 50 --duration 30
+    python benchmark.py http --mode closed --concurrency 20 --requests 500
+    python benchmark.py inproc --target agent --requests 5000
+    python benchmark.py inproc --target rag_mock --output new.json --compare old.json
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import math
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+API_URL = "http://localhost:8000"
+
+DEFAULT_GOALS = "React:5,JavaScript:3,MERN:2,SaaS:2,Python:2,HTML:1,CSS:1,Vue:1,Docker:1,TypeScript:1"
+DEFAULT_SKILL_SETS = "HTML,CSS:4;:2;HTML,CSS,JavaScript:2;Python:1"
+DEFAULT_DURATIONS = "4:4,8:2,12:1"
+
+
+# --- HDR histogram ---
+
+class HdrHistogram:
+    """
+    High dynamic range histogram of integer microsecond values.
+    Values keep `significant_figures` decimal digits of precision at any
+    magnitude by bucketing on (power-of-two shift, top sub-bucket bits).
+    """
+
+    def __init__(self, significant_figures: int = 3):
+        self.significant_figures = significant_figures
+        self.sub_bucket_bits = math.ceil(math.log2(2 * 10 ** significant_figures))
+        self.counts: Dict[Tuple[int, int], int] = {}
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.sum = 0
+
+    def record(self, value_us: int, count: int = 1):
+        value_us = max(int(value_us), 0)
+        shift = max(value_us.bit_length() - self.sub_bucket_bits, 0)
+        key = (shift, value_us >> shift)
+        self.counts[key] = self.counts.get(key, 0) + count
+        self.total += count
+        self.sum += value_us * count
+        self.min = value_us if self.min is None else min(self.min, value_us)
+        self.max = value_us if self.max is None else max(self.max, value_us)
+
+    @staticmethod
+    def _bucket_value(key: Tuple[int, int]) -> int:
+        """Highest value equivalent to the bucket (HDR reports upper bounds)."""
+        shift, sub = key
+        return ((sub + 1) << shift) - 1 if shift else sub
+
+    def value_at_percentile(self, percentile: float) -> int:
+        if not self.total:
+            return 0
+        target = max(1, math.ceil(self.total * percentile / 100.0))
+        seen = 0
+        for key in sorted(self.counts, key=self._bucket_value):
+            seen += self.counts[key]
+            if seen >= target:
+                return min(self._bucket_value(key), self.max)
+        return self.max
+
+    def merge(self, other: "HdrHistogram"):
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+        if other.total:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def summary(self) -> Dict[str, float]:
+        """Latency summary in milliseconds."""
+        to_ms = lambda us: us / 1000.0
+        return {
+            "count": self.total,
+            "mean_ms": to_ms(self.sum / self.total) if self.total else 0.0,
+            "min_ms": to_ms(self.min or 0),
+            "p50_ms": to_ms(self.value_at_percentile(50)),
+            "p95_ms": to_ms(self.value_at_percentile(95)),
+            "p99_ms": to_ms(self.value_at_percentile(99)),
+            "p99_9_ms": to_ms(self.value_at_percentile(99.9)),
+            "max_ms": to_ms(self.max or 0),
+        }
+
+    def to_buckets(self) -> List[List[int]]:
+        """[[bucket_upper_value_us, count], ...] for storing raw distributions."""
+        return [[self._bucket_value(k), c] for k, c in sorted(self.counts.items(), key=lambda kc: self._bucket_value(kc[0]))]
+
+
+# --- Workload distributions ---
+
+def parse_weighted(spec: str, item_sep: str = ",") -> List[Tuple[str, float]]:
+    """Parses 'a:3,b:1' (weights optional, default 1) into [(value, weight), ...]."""
+    items = []
+    for part in spec.split(item_sep):
+        value, _, weight = part.rpartition(":")
+        if not _:
+            value, weight = part, "1"
+        items.append((value.strip(), float(weight)))
+    return items
+
+
+class Workload:
+    """Random roadmap requests drawn from weighted goal, skill-set and duration distributions."""
+
+    def __init__(self, goals: str, skill_sets: str, durations: str, seed: Optional[int] = None):
+        self.goals = parse_weighted(goals)
+        self.skill_sets = [
+            ([s.strip() for s in value.split(",") if s.strip()], weight)
+            for value, weight in parse_weighted(skill_sets, item_sep=";")
+        ]
+        self.durations = [(int(v), w) for v, w in parse_weighted(durations)]
+        self.rng = random.Random(seed)
+
+    def _pick(self, items):
+        values, weights = zip(*items)
+        return self.rng.choices(values, weights=weights)[0]
+
+    def next_request(self) -> Dict[str, Any]:
+        return {
+            "current_skills": self._pick(self.skill_sets),
+            "goal": self._pick(self.goals),
+            "weekly_hours": 10,
+            "duration_weeks": self._pick(self.durations),
+        }
+
+
+# --- HTTP mode ---
+
+class Recorder:
+    """Collects latencies and outcome counts for one run."""
+
+    def __init__(self):
+        self.histogram = HdrHistogram()
+        self.outcomes: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    def success(self, latency_s: float, outcome: str):
+        self.histogram.record(latency_s * 1_000_000)
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def failure(self, error: str):
+        self.errors[error] = self.errors.get(error, 0) + 1
+
+    def merge(self, other: "Recorder"):
+        self.histogram.merge(other.histogram)
+        for k, v in other.outcomes.items():
+            self.outcomes[k] = self.outcomes.get(k, 0) + v
+        for k, v in other.errors.items():
+            self.errors[k] = self.errors.get(k, 0) + v
+
+
+async def _wait_sse(client, task_id: str, timeout: float) -> Dict[str, Any]:
+    event = None
+    async with client.stream("GET", f"/tasks/{task_id}/events", timeout=timeout) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: ") and event in ("completed", "failed"):
+                return {"status": event, "data": json.loads(line[len("data: "):])}
+    raise RuntimeError("event stream closed early")
+
+
+async def _wait_poll(client, task_id: str, timeout: float, interval: float) -> Dict[str, Any]:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        response = await client.get(f"/tasks/{task_id}")
+        response.raise_for_status()
+        data = response.json()
+        if data.get("status") in ("completed", "failed"):
+            return {"status": data["status"], "data": data}
+        await asyncio.sleep(interval)
+    raise TimeoutError("task did not complete")
+
+
+async def _one_request(client, payload: Dict[str, Any], args, recorder: Recorder, scheduled_at: float):
+    try:
+        response = await client.post("/generate-roadmap", json=payload)
+        if response.status_code == 429:
+            recorder.failure("rejected_429")
+            return
+        response.raise_for_status()
+        body = response.json()
+        if body.get("status") == "completed":
+            outcome = "inline"
+        else:
+            if args.wait == "sse":
+                done = await _wait_sse(client, body["task_id"], args.timeout)
+            else:
+                done = await _wait_poll(client, body["task_id"], args.timeout, args.poll_interval)
+            if done["status"] != "completed":
+                recorder.failure("task_failed")
+                return
+            outcome = "task"
+        recorder.success(time.perf_counter() - scheduled_at, outcome)
+    except Exception as e:
+        recorder.failure(type(e).__name__)
+
+
+async def run_http(args, workload: Workload) -> Tuple[Recorder, float]:
+    import httpx
+
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        (await client.get("/health")).raise_for_status()
+        start = time.perf_counter()
+
+        if args.mode == "open":
+            # Constant arrival rate; latency counts from the scheduled send time
+            interval = 1.0 / args.rate
+            total = int(args.rate * args.duration)
+            pending = []
+            for i in range(total):
+                scheduled_at = start + i * interval
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                pending.append(asyncio.create_task(
+                    _one_request(client, workload.next_request(), args, recorder, scheduled_at)
+                ))
+            await asyncio.gather(*pending)
+        else:
+            remaining = args.requests
+
+            async def user():
+                nonlocal remaining
+                while remaining > 0:
+                    remaining -= 1
+                    await _one_request(client, workload.next_request(), args, recorder, time.perf_counter())
+
+            await asyncio.gather(*(user() for _ in range(args.concurrency)))
+
+        elapsed = time.perf_counter() - start
+    return recorder, elapsed
+
+
+# --- In-process mode ---
+
+def _inproc_target(name: str) -> Callable[[Dict[str, Any]], Any]:
+    if name == "agent":
+        import agent
+        agent.warm_graph_registry()
+        return lambda r: agent.generate_roadmap_with_agent(r["goal"], r["duration_weeks"], r["current_skills"])
+    if name == "rag_mock":
+        import rag_service_mock
+        rag_service_mock.build_sample_index()
+        return lambda r: rag_service_mock.query_resources(r["goal"])
+    if name == "rag":
+        import rag_service
+        rag_service.build_sample_index()
+        return lambda r: rag_service.query_resources(r["goal"])
+    raise ValueError(f"Unknown in-process target: {name}")
+
+
+def run_inproc(args, workload: Workload) -> Tuple[Recorder, float]:
+    fn = _inproc_target(args.target)
+    payloads = [workload.next_request() for _ in range(args.requests)]
+    for payload in payloads[:min(args.warmup, len(payloads))]:
+        fn(payload)
+
+    def timed(payload) -> Recorder:
+        local = Recorder()
+        t0 = time.perf_counter()
+        try:
+            fn(payload)
+            local.success(time.perf_counter() - t0, args.target)
+        except Exception as e:
+            local.failure(type(e).__name__)
+        return local
+
+    recorder = Recorder()
+    start = time.perf_counter()
+    if args.concurrency <= 1:
+        for payload in payloads:
+            recorder.merge(timed(payload))
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            for part in executor.map(timed, payloads):
+                recorder.merge(part)
+    return recorder, time.perf_counter() - start
+
+
+# --- Reporting ---
+
+def build_report(args, recorder: Recorder, elapsed: float) -> Dict[str, Any]:
+    completed = recorder.histogram.total
+    failed = sum(recorder.errors.values())
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "compare")}
+    return {
+        "config": config,
+        "elapsed_s": elapsed,
+        "completed": completed,
+        "failed": failed,
+        "throughput_rps": completed / elapsed if elapsed else 0.0,
+        "latency": recorder.histogram.summary(),
+        "outcomes": recorder.outcomes,
+        "errors": recorder.errors,
+        "histogram_us": recorder.histogram.to_buckets(),
+    }
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    latency = report["latency"]
+    print(f"\n{'='*60}")
+    print("Benchmark Results")
+    print(f"{'='*60}\n")
+    print(f"Completed: {report['completed']}   Failed: {report['failed']}   Elapsed: {report['elapsed_s']:.2f}s")
+    print(f"Throughput: {report['throughput_rps']:.1f} req/s")
+    if report["outcomes"]:
+        print(f"Outcomes: {report['outcomes']}")
+    if report["errors"]:
+        print(f"Errors: {report['errors']}")
+    print()
+
+    keys = ["mean_ms", "p50_ms", "p95_ms", "p99_ms", "p99_9_ms", "max_ms"]
+    header = f"{'metric':<10}{'value':>12}"
+    if baseline:
+        header += f"{'baseline':>12}{'change':>10}"
+    print(header)
+    rows = [("rps", report["throughput_rps"], baseline["throughput_rps"] if baseline else None)]
+    rows += [(k[:-3], latency[k], baseline["latency"][k] if baseline else None) for k in keys]
+    for name, value, base in rows:
+        line = f"{name:<10}{value:>12.4f}"
+        if base is not None:
+            change = (value - base) / base * 100 if base else 0.0
+            line += f"{base:>12.4f}{change:>+9.1f}%"
+        print(line)
+    print(f"\n{'='*60}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(p):
+        p.add_argument("--goals", default=DEFAULT_GOALS, help="Weighted goals, e.g. 'React:5,Python:1'")
+        p.add_argument("--skill-sets", default=DEFAULT_SKILL_SETS, help="Weighted skill sets, e.g. 'HTML,CSS:3;:1'")
+        p.add_argument("--durations", default=DEFAULT_DURATIONS, help="Weighted durations, e.g. '4:3,8:1'")
+        p.add_argument("--seed", type=int, default=None)
+        p.add_argument("--requests", type=int, default=1000, help="Requests (closed-loop / in-process)")
+        p.add_argument("--concurrency", type=int, default=10)
+        p.add_argument("--output", help="Write the JSON report to this file")
+        p.add_argument("--compare", help="Baseline JSON report to compare against")
+
+    http = sub.add_parser("http", help="Drive a running API")
+    add_common(http)
+    http.add_argument("--url", default=API_URL)
+    http.add_argument("--mode", choices=["open", "closed"], default="closed")
+    http.add_argument("--rate", type=float, default=20.0, help="Arrivals per second (open-loop)")
+    http.add_argument("--duration", type=float, default=30.0, help="Seconds of arrivals (open-loop)")
+    http.add_argument("--wait", choices=["sse", "poll"], default="sse", help="How to wait for queued tasks")
+    http.add_argument("--poll-interval", type=float, default=0.2)
+    http.add_argument("--timeout", type=float, default=60.0)
+    http.add_argument("--max-connections", type=int, default=200)
+
+    inproc = sub.add_parser("inproc", help="Benchmark functions in-process")
+    add_common(inproc)
+    inproc.add_argument("--target", choices=["agent", "rag_mock", "rag"], default="agent")
+    inproc.add_argument("--warmup", type=int, default=50)
+
+    args = parser.parse_args()
+    workload = Workload(args.goals, args.skill_sets, args.durations, seed=args.seed)
+
+    if args.command == "http":
+        recorder, elapsed = asyncio.run(run_http(args, workload))
+    else:
+        recorder, elapsed = run_inproc(args, workload)
+
+    report = build_report(args, recorder, elapsed)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
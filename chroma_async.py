@@ -0,0 +1,167 @@
+"""
+Async, pooled retrieval against ChromaDB.
+
+Queries go through a small pool of chromadb.AsyncHttpClient connections with a
+concurrency limit and a per-call deadline. Optionally a hedged second query is
+fired once the primary has been outstanding longer than the recent p95
+latency, and when Chroma is slow or down the query is answered from an
+in-process snapshot of the collection (a LocalVectorIndex).
+
+Sync callers (the LangGraph nodes, Celery tasks) use run_sync(), which submits
+coroutines to one background event loop per process.
+"""
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from vector_index import LocalVectorIndex, QueryResult
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+_loop_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Background event loop for this process (restarted after fork)."""
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name="chroma-async", daemon=True).start()
+        return _loop
+
+
+def run_sync(coro, timeout: Optional[float] = None):
+    """Runs a coroutine on the background loop and waits for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result(timeout)
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies."""
+
+    def __init__(self, window: int = 256):
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self._samples) < 20:
+            return None
+        samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+class AsyncChromaRetriever:
+    """
+    Pooled async query client for one collection with deadlines, hedging and
+    snapshot fallback. Counters record how each query was answered.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        collection_name: str,
+        pool_size: int = 4,
+        max_concurrency: int = 32,
+        timeout: float = 2.0,
+        hedge: bool = True,
+        hedge_min_delay: float = 0.02,
+    ):
+        self.host = host
+        self.port = port
+        self.collection_name = collection_name
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.latency = LatencyTracker()
+        self.snapshot: Optional[LocalVectorIndex] = None
+        self.counters = {"primary": 0, "hedged": 0, "hedge_wins": 0, "snapshot_fallbacks": 0, "errors": 0}
+        self._collections: List[Any] = [None] * pool_size
+        self._round_robin = itertools.count()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def _collection(self, slot: int):
+        if self._collections[slot] is None:
+            import chromadb
+            client = await chromadb.AsyncHttpClient(host=self.host, port=self.port)
+            self._collections[slot] = await client.get_or_create_collection(self.collection_name)
+        return self._collections[slot]
+
+    async def _query_once(self, query_embeddings: List[List[float]], n_results: int) -> QueryResult:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        slot = next(self._round_robin) % self.pool_size
+        async with self._semaphore:
+            start = time.perf_counter()
+            collection = await self._collection(slot)
+            result = await collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                include=["documents", "metadatas", "distances"]
+            )
+            self.latency.record(time.perf_counter() - start)
+            return result
+
+    async def _hedged_query(self, query_embeddings: List[List[float]], n_results: int) -> QueryResult:
+        primary = asyncio.ensure_future(self._query_once(query_embeddings, n_results))
+        pending = {primary}
+        try:
+            p95 = self.latency.percentile(0.95)
+            if self.hedge and p95 is not None:
+                done, pending = await asyncio.wait(pending, timeout=max(p95, self.hedge_min_delay))
+                if not done:
+                    self.counters["hedged"] += 1
+                    backup = asyncio.ensure_future(self._query_once(query_embeddings, n_results))
+                    pending.add(backup)
+                    while pending:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for future in done:
+                            if future.exception() is None:
+                                if future is backup:
+                                    self.counters["hedge_wins"] += 1
+                                return future.result()
+                    # Both attempts failed
+                    return primary.result()
+
+            self.counters["primary"] += 1
+            pending = set()
+            return await primary
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def query(self, query_embeddings: List[List[float]], n_results: int, timeout: Optional[float] = None) -> QueryResult:
+        """
+        Queries Chroma within the deadline; on timeout or error falls back to the
+        snapshot when one is loaded, otherwise re-raises.
+        """
+        try:
+            return await asyncio.wait_for(
+                self._hedged_query(query_embeddings, n_results),
+                timeout=self.timeout if timeout is None else timeout
+            )
+        except Exception as e:
+            self.counters["errors"] += 1
+            if self.snapshot is None:
+                raise
+            print(f"[Chroma] Query failed or timed out ({type(e).__name__}); answering from snapshot")
+            self.counters["snapshot_fallbacks"] += 1
+            return self.snapshot.query(query_embeddings, n_results)
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.latency.percentile(0.95)
+        return dict(
+            self.counters,
+            p95_ms=None if p95 is None else p95 * 1000,
+            snapshot_size=0 if self.snapshot is None else len(self.snapshot)
+        )
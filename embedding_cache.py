@@ -0,0 +1,280 @@
+"""
+Content-addressed embedding cache and query micro-batching for the RAG service.
+
+Embeddings are keyed on sha256(model name + text), held in an in-process LRU and
+optionally persisted to an append-only float32 file that is memory-mapped on
+load. Cache misses go through a MicroBatcher, which collects concurrent queries
+inside a worker into a single model forward pass.
+"""
+
+import fcntl
+import hashlib
+import os
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from roadmap_cache import LRUCache
+
+EmbedBatchFn = Callable[[List[str]], List[List[float]]]
+
+
+def embedding_key(model_name: str, text: str) -> str:
+    """Content address for an embedding."""
+    return hashlib.sha256(f"{model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class DiskEmbeddingStore:
+    """
+    Append-only on-disk store: <path>.keys holds one digest per line and
+    <path>.f32 holds the matching float32 rows, memory-mapped for reads.
+    Appends take an exclusive flock so prefork children can share the files.
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self._keys_path = f"{path}.keys"
+        self._vectors_path = f"{path}.f32"
+        self._keys: List[str] = []
+        self._keys_offset = 0
+        self._rows: Dict[str, int] = {}
+        self._matrix: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        """Picks up rows appended (by any process) since the last call; reads only the new keys."""
+        try:
+            keys_size = os.path.getsize(self._keys_path)
+            vectors_size = os.path.getsize(self._vectors_path)
+        except OSError:
+            return
+        if keys_size > self._keys_offset:
+            with open(self._keys_path, "rb") as f:
+                f.seek(self._keys_offset)
+                data = f.read(keys_size - self._keys_offset)
+            # Only whole lines; a partial one is picked up once its append completes
+            data = data[:data.rfind(b"\n") + 1]
+            self._keys_offset += len(data)
+            self._keys.extend(line.strip().decode() for line in data.splitlines() if line.strip())
+        # Ignore a torn trailing row from an interrupted append
+        n_rows = min(len(self._keys), vectors_size // (4 * self.dim))
+        if n_rows > len(self._rows):
+            for i in range(len(self._rows), n_rows):
+                self._rows[self._keys[i]] = i
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(n_rows, self.dim))
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        row, matrix = self._rows.get(key), self._matrix
+        if row is None:
+            # Another process may have appended since we mapped the file
+            with self._lock:
+                self._refresh()
+                row, matrix = self._rows.get(key), self._matrix
+            if row is None:
+                return None
+        return matrix[row]
+
+    def put(self, key: str, vector: List[float]):
+        data = np.asarray(vector, dtype=np.float32)
+        if data.shape != (self.dim,):
+            raise ValueError(f"Expected embedding of dim {self.dim}, got {data.shape}")
+        with self._lock, open(self._keys_path, "a") as keys_file:
+            fcntl.flock(keys_file, fcntl.LOCK_EX)
+            try:
+                with open(self._vectors_path, "ab") as vectors_file:
+                    vectors_file.write(data.tobytes())
+                keys_file.write(key + "\n")
+                # The key line must reach the file before another appender gets the lock,
+                # or keys and rows end up in different orders
+                keys_file.flush()
+            finally:
+                fcntl.flock(keys_file, fcntl.LOCK_UN)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+class MicroBatcher:
+    """
+    Collects concurrent embed requests for up to max_wait_ms (or max_batch texts)
+    and runs them through embed_batch_fn in one call.
+    """
+
+    def __init__(self, embed_batch_fn: EmbedBatchFn, max_batch: int = 32, max_wait_ms: float = 5.0):
+        self.embed_batch_fn = embed_batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending: List[tuple] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def _ensure_thread(self):
+        # Threads do not survive fork, so each worker child starts its own
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pending = []
+            self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        with self._cond:
+            self._ensure_thread()
+            self._pending.append((text, future))
+            self._cond.notify()
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        """Blocking single-text embed that shares a forward pass with concurrent callers."""
+        return self.submit(text).result()
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Embeds several texts, batched together with any concurrent callers."""
+        futures = [self.submit(text) for text in texts]
+        return [f.result() for f in futures]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # Give concurrent callers a short window to join the batch
+                self._cond.wait_for(lambda: len(self._pending) >= self.max_batch, timeout=self.max_wait)
+                batch = self._pending[:self.max_batch]
+                self._pending = self._pending[self.max_batch:]
+
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = dict(zip(texts, self.embed_batch_fn(texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for text, future in batch:
+                future.set_result(vectors[text])
+
+
+def _infer_dim(path: str) -> Optional[int]:
+    """Recovers the vector dimension of an existing on-disk store."""
+    try:
+        with open(f"{path}.keys", "r") as f:
+            n_keys = sum(1 for line in f if line.strip())
+        size = os.path.getsize(f"{path}.f32")
+    except OSError:
+        return None
+    return size // (4 * n_keys) if n_keys else None
+
+
+class EmbeddingCache:
+    """In-memory LRU, then optional disk store, then the (batched) embedder."""
+
+    def __init__(
+        self,
+        model_name: str,
+        embed_fn: Callable[[str], List[float]],
+        max_size: int = 4096,
+        disk_path: Optional[str] = None,
+        dim: Optional[int] = None,
+        embed_many_fn: Optional[EmbedBatchFn] = None,
+    ):
+        self.model_name = model_name
+        self.embed_fn = embed_fn
+        self.embed_many_fn = embed_many_fn or (lambda texts: [embed_fn(t) for t in texts])
+        self.memory = LRUCache(max_size=max_size, ttl_seconds=None)
+        self.disk_path = disk_path
+        self.dim = dim
+        self.disk: Optional[DiskEmbeddingStore] = None
+        if disk_path:
+            dim = dim or _infer_dim(disk_path)
+            if dim:
+                self.disk = DiskEmbeddingStore(disk_path, dim)
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._counters_lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, counter: str, n: int = 1):
+        with self._counters_lock:
+            self.counters[counter] += n
+
+    def _lookup(self, key: str) -> Optional[List[float]]:
+        vector = self.memory.get(key)
+        if vector is not None:
+            self._count("memory_hits")
+            return vector
+
+        if self.disk is not None:
+            row = self.disk.get(key)
+            if row is not None:
+                vector = row.tolist()
+                self.memory.set(key, vector)
+                self._count("disk_hits")
+                return vector
+        return None
+
+    def _store(self, key: str, vector: List[float]):
+        self.memory.set(key, vector)
+        if self.disk_path:
+            if self.disk is None:
+                # Dimension is only known after the first embedding
+                self.disk = DiskEmbeddingStore(self.disk_path, len(vector))
+            self.disk.put(key, vector)
+
+    def get(self, text: str) -> List[float]:
+        """Returns the embedding for text, computing and storing it on a miss."""
+        key = embedding_key(self.model_name, text)
+        vector = self._lookup(key)
+        if vector is not None:
+            return vector
+
+        # Concurrent misses for the same text wait on a single computation
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+        if not owner:
+            return future.result()
+
+        self._count("misses")
+        try:
+            vector = list(self.embed_fn(text))
+            self._store(key, vector)
+            future.set_result(vector)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return vector
+
+    def get_many(self, texts: List[str]) -> List[List[float]]:
+        """Returns embeddings for texts; all misses are computed in one embed_many_fn call."""
+        keys = [embedding_key(self.model_name, text) for text in texts]
+        vectors: Dict[str, List[float]] = {}
+        misses: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key in vectors or key in misses:
+                continue
+            vector = self._lookup(key)
+            if vector is None:
+                misses[key] = text
+            else:
+                vectors[key] = vector
+
+        if misses:
+            self._count("misses", len(misses))
+            for key, vector in zip(misses, self.embed_many_fn(list(misses.values()))):
+                vector = list(vector)
+                self._store(key, vector)
+                vectors[key] = vector
+        return [vectors[key] for key in keys]
@@ -0,0 +1,94 @@
+"""
+In-process execution of the roadmap agent for the API's synchronous fast path.
+
+With the mock retriever and rule-based reasoning the agent needs microseconds of
+CPU, so queueing it through Celery costs far more than running it. The runner
+executes it on a bounded thread pool under a latency budget and reports when
+the caller should fall back to the Celery path instead. A call abandoned over
+budget is told so through its cancel event and is expected to stop early, so
+the work isn't done both inline and on Celery.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class InlineRunner:
+    """
+    Bounded thread pool with admission control.
+    A call is only admitted while fewer than max_workers + max_queue calls are in
+    flight and the recent (EWMA) latency fits in the budget; it is abandoned to
+    the caller's fallback if it fails or doesn't finish within budget_ms.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 16, budget_ms: float = 250.0, ewma_alpha: float = 0.2):
+        self.max_workers = max_workers
+        self.max_inflight = max_workers + max_queue
+        self.budget = budget_ms / 1000.0
+        self.ewma_alpha = ewma_alpha
+        self.ewma_latency = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inline-agent")
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self.counters = {"inline": 0, "rejected_saturated": 0, "rejected_slow": 0, "budget_exceeded": 0, "failed": 0}
+
+    def _admit(self) -> bool:
+        with self._lock:
+            if self._inflight >= self.max_inflight:
+                self.counters["rejected_saturated"] += 1
+                return False
+            if self.ewma_latency > self.budget:
+                self.counters["rejected_slow"] += 1
+                # Let an occasional call through so the estimate can recover
+                if self.counters["rejected_slow"] % 20:
+                    return False
+            self._inflight += 1
+            return True
+
+    def _record(self, elapsed: float):
+        with self._lock:
+            self._inflight -= 1
+            self.ewma_latency += self.ewma_alpha * (elapsed - self.ewma_latency)
+
+    def _timed(self, fn: Callable[..., Any], kwargs: Dict[str, Any]) -> Any:
+        start = time.perf_counter()
+        try:
+            return fn(**kwargs)
+        finally:
+            self._record(time.perf_counter() - start)
+
+    async def run(self, fn: Callable[..., Any], cancel: Optional[threading.Event] = None, **kwargs) -> Optional[Any]:
+        """
+        Runs fn(**kwargs) on the pool. Returns its result, or None when the call
+        was not admitted, failed or exceeded the latency budget. If cancel is
+        given it is passed on to fn and set when the call is abandoned; otherwise
+        an abandoned call runs to completion in the background.
+        """
+        if not self._admit():
+            return None
+        if cancel is not None:
+            kwargs["cancel"] = cancel
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, self._timed, fn, kwargs)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=self.budget)
+        except asyncio.TimeoutError:
+            self.counters["budget_exceeded"] += 1
+            if cancel is not None:
+                cancel.set()
+            # Nobody awaits the abandoned call: consume its outcome so a late error isn't logged as unhandled
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            return None
+        except Exception as e:
+            self.counters["failed"] += 1
+            print(f"[Inline] Agent failed, falling back to Celery: {e}")
+            return None
+        self.counters["inline"] += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counters, inflight=self._inflight, ewma_latency_ms=self.ewma_latency * 1000)
@@ -1,16 +1,71 @@
-from typing import List, Optional, Any
-from fastapi import FastAPI, HTTPException
+import asyncio
+import math
+import os
+import threading
+import uuid
+import orjson
+from typing import Dict, List, Optional, Any, Tuple
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel, Field
-from celery.result import AsyncResult
+from celery import group
+from celery.result import AsyncResult, GroupResult
+import agent
 import tasks
+import task_events
+import metrics
+import queues
+import roadmap_cache
+import single_flight
+import backpressure
+from admission import TenantAdmission
+from inline_runner import InlineRunner
 
 app = FastAPI(title="Smart Learning Path Generator API")
 
-# Initialize RAG index on startup (optional, but good for performance)
-# Note: In async mode, the worker will need the index, not necessarily the API
+# Execution mode: "auto" runs the agent in-process within a latency budget and
+# falls back to Celery when the budget is exceeded or the pool is saturated;
+# "celery" always enqueues.
+EXECUTION_MODE = os.getenv("ROADMAP_EXECUTION_MODE", "auto")
+
+inline_runner = InlineRunner(
+    max_workers=int(os.getenv("INLINE_MAX_WORKERS", "4")),
+    max_queue=int(os.getenv("INLINE_MAX_QUEUE", "16")),
+    budget_ms=float(os.getenv("INLINE_LATENCY_BUDGET_MS", "250"))
+)
+
+# Per-tenant token buckets (requests/second and burst, scaled by TENANT_WEIGHTS);
+# ADMISSION_RATE=0 disables admission control. Tenants are identified by X-Tenant-ID.
+TENANT_HEADER = "X-Tenant-ID"
+DEFAULT_TENANT = "anonymous"
+admission = TenantAdmission(
+    rate=float(os.getenv("ADMISSION_RATE", "5")),
+    burst=float(os.getenv("ADMISSION_BURST", "20")),
+    weights=queues.parse_weights(os.getenv("TENANT_WEIGHTS", "")),
+    global_rate=float(os.getenv("ADMISSION_GLOBAL_RATE", "0")),
+    global_burst=float(os.getenv("ADMISSION_GLOBAL_BURST", "0"))
+)
+
+# Queue-depth-aware backpressure on Celery work, driven by the signals published by
+# `python backpressure.py`; without a running sampler every request is admitted.
+BACKPRESSURE_ENABLED = os.getenv("BACKPRESSURE_ENABLED", "true").lower() == "true"
+backpressure_signals = backpressure.SignalReader(
+    redis_client_factory=lambda: tasks.celery_app.backend.client,
+    refresh_seconds=float(os.getenv("BACKPRESSURE_REFRESH_SECONDS", "1"))
+)
+adaptive_admission = backpressure.AdaptiveAdmission(backpressure_signals.latest)
+
+MAX_DURATION_WEEKS = int(os.getenv("MAX_DURATION_WEEKS", "52"))
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "50"))
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "1000"))
+
+# The API never loads the RAG stack; the worker does. In auto mode the agent graph
+# (and LangGraph with it) is compiled in the background so startup isn't delayed.
 @app.on_event("startup")
 async def startup_event():
-    pass
+    if EXECUTION_MODE == "auto":
+        asyncio.get_running_loop().run_in_executor(None, agent.warm_graph_registry)
 
 
 # --- Pydantic Models ---
@@ -19,7 +74,7 @@ class RoadmapRequest(BaseModel):
     current_skills: List[str] = Field(..., description="List of current skills")
     goal: str = Field(..., min_length=3, description="The learning goal")
     weekly_hours: int = Field(..., ge=1, le=168, description="Hours available per week")
-    duration_weeks: int = Field(..., ge=1, le=52, description="Duration of the roadmap in weeks")
+    duration_weeks: int = Field(..., ge=1, le=MAX_DURATION_WEEKS, description="Duration of the roadmap in weeks")
 
 class RoadmapWeek(BaseModel):
     week_number: int
@@ -32,9 +87,17 @@ class RoadmapResponse(BaseModel):
     roadmap: List[RoadmapWeek]
     total_weeks: int
 
+class BatchResponse(BaseModel):
+    group_id: str
+    status: str
+    total: int
+
 class TaskResponse(BaseModel):
-    task_id: str
+    task_id: Optional[str] = None
     status: str
+    result: Optional[RoadmapResponse] = None
+    # Pass back as ?reader= when polling, so a shared result can expire once everyone has it
+    reader: Optional[str] = None
 
 # --- Endpoints ---
 
@@ -43,38 +106,342 @@ async def health_check():
     """Health check endpoint to verify service status."""
     return {"status": "ok"}
 
+def _json_response(payload: Any) -> Response:
+    """Serializes with orjson, skipping FastAPI's jsonable_encoder pass."""
+    return Response(content=orjson.dumps(payload), media_type="application/json")
+
+def _completed_response(result: dict) -> Response:
+    """
+    Inline/cached completion. Roadmaps are produced by our own agent, so they are
+    serialized with orjson directly instead of being re-validated against RoadmapResponse.
+    """
+    return _json_response({"task_id": None, "status": "completed", "result": result})
+
+def _tenant(http_request: Request) -> str:
+    return http_request.headers.get(TENANT_HEADER) or DEFAULT_TENANT
+
+def _admit(tenant: str, cost: float = 1.0):
+    """Raises 429 with Retry-After when the tenant (or the API as a whole) is out of tokens."""
+    wait = admission.admit(tenant, cost)
+    if wait > 0:
+        retry_after = str(math.ceil(wait)) if math.isfinite(wait) else "60"
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests; retry later.",
+            headers={"Retry-After": retry_after}
+        )
+
+def _backpressure(queue: str) -> bool:
+    """
+    Applies adaptive admission to work for a Celery queue. Raises 503 with
+    Retry-After when the queue's estimated wait is past its maximum; returns
+    True when the task should be deferred to the lowest broker priority.
+    """
+    if not BACKPRESSURE_ENABLED:
+        return False
+    action, wait = adaptive_admission.decide(queue)
+    if action == backpressure.SHED:
+        retry_after = str(math.ceil(wait)) if math.isfinite(wait) else "60"
+        raise HTTPException(
+            status_code=503,
+            detail="Workers are overloaded; retry later.",
+            headers={"Retry-After": retry_after}
+        )
+    return action == backpressure.DEFER
+
+def _generate_and_cache(goal: str, duration_weeks: int, current_skills: List[str], cancel: threading.Event) -> Optional[dict]:
+    """
+    Runs the agent in-process and stores the result like the Celery task does.
+    Stops after the current node once cancel is set: the request has fallen back
+    to Celery, which produces (and caches) the result instead.
+    """
+    for kind, payload in agent.stream_roadmap_with_agent(goal, duration_weeks, current_skills):
+        if cancel.is_set():
+            return None
+        if kind == "result":
+            tasks.result_cache.set(goal, current_skills, duration_weeks, payload)
+            return payload
+    return None
+
+# Inline runs in progress in this process, by request digest
+_inline_flights: Dict[str, asyncio.Future] = {}
+
+async def _run_inline(digest: str, request: RoadmapRequest) -> Optional[dict]:
+    """
+    Runs the agent through the inline runner. Returns None when the caller should
+    fall back to Celery (pool saturated, agent failed or over budget; an over-budget
+    run is cancelled so only Celery finishes the work).
+    """
+    # An identical request may have started while this one awaited Redis; check and
+    # register with no await in between so only one of them runs the agent
+    flight = _inline_flights.get(digest)
+    if flight is not None:
+        result = await asyncio.shield(flight)
+        if result is not None:
+            metrics.COALESCED.labels(path="inline").inc()
+        return result
+    flight = asyncio.get_running_loop().create_future()
+    _inline_flights[digest] = flight
+    try:
+        result = await inline_runner.run(
+            _generate_and_cache,
+            cancel=threading.Event(),
+            goal=request.goal,
+            duration_weeks=request.duration_weeks,
+            current_skills=request.current_skills
+        )
+        flight.set_result(result)
+        return result
+    finally:
+        # Followers of a failed run fall back to their own path
+        if not flight.done():
+            flight.set_result(None)
+        if _inline_flights.get(digest) is flight:
+            del _inline_flights[digest]
+
+def _lookup(request: RoadmapRequest) -> Optional[dict]:
+    """Records the request's popularity; returns its precomputed or cached roadmap, if any."""
+    tasks.popularity.record(request.goal, request.current_skills, request.duration_weeks)
+    precomputed = tasks.materialized_roadmaps.get(request.goal, request.current_skills, request.duration_weeks)
+    if precomputed is not None:
+        return precomputed
+    return tasks.result_cache.get(request.goal, request.current_skills, request.duration_weeks)
+
+def _enqueue(digest: str, request: RoadmapRequest, reader: str, priority: int) -> Tuple[str, bool]:
+    """
+    Claims the digest and publishes the Celery task. Returns (task_id, shared):
+    shared is True when an identical task was claimed first and is joined instead.
+    """
+    task_id = str(uuid.uuid4())
+    shared_task_id = tasks.inflight.claim(digest, task_id, reader)
+    if shared_task_id is not None:
+        return shared_task_id, True
+    try:
+        tasks.generate_roadmap_task.apply_async(
+            kwargs={
+                "goal": request.goal,
+                "duration_weeks": request.duration_weeks,
+                "current_skills": request.current_skills
+            },
+            task_id=task_id,
+            priority=priority
+        )
+    except Exception:
+        # Nothing was published: release the claim so duplicates don't wait on a phantom task
+        tasks.inflight.abandon(digest, task_id)
+        raise
+    return task_id, False
+
 @app.post("/generate-roadmap", response_model=TaskResponse)
-async def generate_roadmap(request: RoadmapRequest):
+async def generate_roadmap(request: RoadmapRequest, http_request: Request):
     """
-    Starts a background task to generate the roadmap.
-    Returns a task_id to poll for results.
+    Generates the roadmap inline when that is cheap, otherwise starts a background task.
+    Returns the roadmap itself (status "completed") or a task_id to poll for results.
+    Identical requests in flight share one execution: they await the same inline run
+    or attach to the same Celery task id (single-flight).
+    Popular requests are served from roadmaps precomputed in the background.
+    Precomputed roadmaps, cache hits and coalesced duplicates are free; other
+    requests are admitted per tenant (429 when over the limit). Requests headed
+    for Celery are deferred or shed (503, refunding the admission token) when the
+    workers are too far behind.
     """
     if not request.goal.strip():
         raise HTTPException(status_code=400, detail="Goal cannot be empty.")
 
-    task = tasks.generate_roadmap_task.delay(
-        goal=request.goal,
-        duration_weeks=request.duration_weeks,
-        current_skills=request.current_skills
+    # Redis lookups (and the popularity flush) run off the event loop
+    ready = await run_in_threadpool(_lookup, request)
+    if ready is not None:
+        return _completed_response(ready)
+
+    digest = roadmap_cache.key_digest(
+        roadmap_cache.canonical_key(request.goal, request.current_skills, request.duration_weeks)
     )
-    
-    return TaskResponse(task_id=task.id, status="processing")
+    flight = _inline_flights.get(digest)
+    if flight is not None:
+        result = await asyncio.shield(flight)
+        if result is not None:
+            metrics.COALESCED.labels(path="inline").inc()
+            return _completed_response(result)
+
+    reader = single_flight.new_reader()
+    shared_task_id = await run_in_threadpool(tasks.inflight.attach, digest, reader)
+    if shared_task_id is not None:
+        metrics.COALESCED.labels(path="celery").inc()
+        return TaskResponse(task_id=shared_task_id, status="processing", reader=reader)
+
+    tenant = _tenant(http_request)
+    _admit(tenant)
+
+    if EXECUTION_MODE == "auto":
+        result = await _run_inline(digest, request)
+        if result is not None:
+            return _completed_response(result)
+
+    # Backpressure only applies to work headed for Celery; a shed request gets its token back
+    try:
+        deferred = await run_in_threadpool(_backpressure, queues.INTERACTIVE_QUEUE)
+    except HTTPException:
+        admission.refund(tenant)
+        raise
+    priority = queues.DEFERRED_PRIORITY if deferred else admission.priority(tenant)
+    task_id, shared = await run_in_threadpool(_enqueue, digest, request, reader, priority)
+    if shared:
+        metrics.COALESCED.labels(path="celery").inc()
+    return TaskResponse(task_id=task_id, status="processing", reader=reader)
+
+def _enqueue_batch(chunks: List[List[dict]], deferred: bool) -> str:
+    """Publishes one batch task per chunk as a saved Celery group; returns the group id."""
+    group_result = group(tasks.generate_roadmap_batch_task.s(chunk) for chunk in chunks).apply_async(
+        # Bulk chunks otherwise keep their route's background priority
+        priority=queues.DEFERRED_PRIORITY if deferred else None
+    )
+    group_result.save()
+    # The group record must live as long as its chunk results
+    tasks.set_result_ttl(tasks.celery_app.backend.get_key_for_group(group_result.id), tasks.BATCH_RESULT_EXPIRES)
+    return group_result.id
+
+@app.post("/generate-roadmaps", response_model=BatchResponse)
+async def generate_roadmaps(requests: List[RoadmapRequest], http_request: Request):
+    """
+    Starts background generation for a cohort of roadmap requests.
+    Requests are split into chunks, each handled by one batch task on the bulk queue;
+    the chunks form a single Celery group whose id is returned for polling /batches/{group_id}.
+    Each chunk costs the tenant one admission token. Batches are deferred or shed
+    (503) when the bulk queue is too far behind.
+    """
+    if not requests:
+        raise HTTPException(status_code=400, detail="At least one request is required.")
+    if len(requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_REQUESTS} requests per batch.")
+    if any(not r.goal.strip() for r in requests):
+        raise HTTPException(status_code=400, detail="Goal cannot be empty.")
+
+    payloads = [
+        {"goal": r.goal, "duration_weeks": r.duration_weeks, "current_skills": r.current_skills}
+        for r in requests
+    ]
+    chunks = [payloads[i:i + BATCH_CHUNK_SIZE] for i in range(0, len(payloads), BATCH_CHUNK_SIZE)]
+    deferred = await run_in_threadpool(_backpressure, queues.BULK_QUEUE)
+    _admit(_tenant(http_request), cost=len(chunks))
+    group_id = await run_in_threadpool(_enqueue_batch, chunks, deferred)
+    return BatchResponse(group_id=group_id, status="processing", total=len(requests))
+
+@app.get("/batches/{group_id}")
+def get_batch_result(group_id: str):
+    """
+    Polls the status of a batch. Once every chunk is done, returns one result per
+    submitted request, in submission order.
+    """
+    group_result = GroupResult.restore(group_id, app=tasks.celery_app)
+    if group_result is None:
+        raise HTTPException(status_code=404, detail="Unknown batch id.")
+
+    if group_result.failed():
+        failed = next(r for r in group_result.results if r.failed())
+        return {"group_id": group_id, "status": "failed", "error": str(failed.result)}
+    if not group_result.ready():
+        return {
+            "group_id": group_id,
+            "status": "processing",
+            "completed_chunks": group_result.completed_count(),
+            "total_chunks": len(group_result.results)
+        }
+
+    results = [roadmap for chunk in group_result.get() for roadmap in chunk]
+    return _json_response({"group_id": group_id, "status": "completed", "results": results})
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters for the roadmap result cache and the precomputed roadmaps."""
+    return {**tasks.result_cache.stats(), "materialized": tasks.materialized_roadmaps.stats()}
+
+@app.get("/inline/stats")
+async def inline_stats():
+    """Admission and latency counters for the in-process fast path."""
+    return inline_runner.stats()
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """Admitted/rejected counters for per-tenant admission control."""
+    return admission.stats()
+
+@app.get("/backpressure/stats")
+def backpressure_stats():
+    """Adaptive admission decisions, admitted fractions and the latest queue signals."""
+    return adaptive_admission.stats()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics for the API process."""
+    body, content_type = metrics.render_latest()
+    return Response(content=body, media_type=content_type)
 
 @app.get("/tasks/{task_id}")
-async def get_task_result(task_id: str):
+def get_task_result(task_id: str, reader: Optional[str] = None):
     """
     Polls the status and result of a background task.
+    While a roadmap task runs, the response carries the weeks generated so far ("partial").
+    Results are stored in the compact roadmap codec; AsyncResult decodes them.
+    Fetching a finished result with the reader token from /generate-roadmap counts
+    that caller out of the task's shared readers (once, however often it polls).
     """
     task_result = AsyncResult(task_id, app=tasks.celery_app)
+    state = task_result.state
+    metrics.TASK_POLLS.labels(status=state).inc()
     
-    if task_result.state == 'PENDING':
+    if state == 'PENDING':
         return {"task_id": task_id, "status": "processing"}
-    elif task_result.state == 'SUCCESS':
-        return {"task_id": task_id, "status": "completed", "result": task_result.result}
-    elif task_result.state == 'FAILURE':
+    elif state == 'SUCCESS':
+        response = _json_response({"task_id": task_id, "status": "completed", "result": task_result.result})
+        if reader:
+            tasks.inflight.collected(task_id, reader)
+        return response
+    elif state == 'FAILURE':
+        if reader:
+            tasks.inflight.collected(task_id, reader)
         return {"task_id": task_id, "status": "failed", "error": str(task_result.result)}
+    elif state == 'PROGRESS':
+        # Streaming task: the weeks generated so far, renderable before the rest arrive
+        progress = task_result.info or {}
+        return _json_response({
+            "task_id": task_id,
+            "status": "processing",
+            "node": progress.get("node"),
+            "partial": progress.get("partial")
+        })
     
-    return {"task_id": task_id, "status": task_result.state}
+    return {"task_id": task_id, "status": state}
+
+def _terminal_event(task_id: str) -> Optional[dict]:
+    """Terminal event for a task that has already finished, else None."""
+    task_result = AsyncResult(task_id, app=tasks.celery_app)
+    if task_result.state == 'SUCCESS':
+        return {"event": "completed", "data": task_result.result}
+    elif task_result.state == 'FAILURE':
+        return {"event": "failed", "data": {"error": str(task_result.result)}}
+    return None
+
+@app.get("/tasks/{task_id}/events")
+async def stream_task_events(task_id: str, request: Request):
+    """
+    Server-Sent Events stream of task progress.
+    Emits a "progress" event per completed agent node and a "week" event per roadmap
+    week as it is generated, then "completed" with the roadmap (or "failed"), and closes. Replaces polling /tasks/{task_id}.
+    """
+    async def event_stream():
+        async for event in task_events.subscribe(task_id, current_state=lambda: _terminal_event(task_id)):
+            if await request.is_disconnected():
+                break
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            yield task_events.format_sse(event["event"], event["data"])
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 if __name__ == "__main__":
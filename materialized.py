@@ -0,0 +1,224 @@
+"""
+Precomputed roadmaps for popular requests.
+
+The API records demand per canonical request in hourly Redis sorted sets. A
+periodic Celery beat job reads the top-N requests of the recent window,
+generates their roadmaps and stores them under the current index generation.
+When the retriever ingests new data the generation is bumped: every stored
+roadmap becomes unreachable at once and expires on its own, and the next
+refresh repopulates the new generation.
+"""
+
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+import orjson
+
+import result_codec
+from roadmap_cache import LRUCache, canonical_key, key_digest
+
+PREFIX = "roadmap:materialized:"
+GENERATION_KEY = PREFIX + "generation"
+POPULARITY_PREFIX = "roadmap:popular:"
+
+
+def _hour_bucket(ts: float) -> int:
+    return int(ts // 3600)
+
+
+def _requests_key(bucket: str) -> str:
+    return f"{bucket}:requests"
+
+
+class PopularityTracker:
+    """
+    Counts requests per canonical key. Counts are aggregated in-process and
+    flushed to Redis in one pipeline every flush_every records or flush_seconds,
+    so recording costs no Redis round trip on most requests.
+    """
+
+    def __init__(
+        self,
+        redis_client_factory: Callable[[], Any],
+        window_hours: int = 24,
+        flush_every: int = 100,
+        flush_seconds: float = 5.0
+    ):
+        self._redis_client_factory = redis_client_factory
+        self._redis = None
+        self.window_hours = window_hours
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self._counts: Counter = Counter()
+        self._requests: Dict[str, bytes] = {}
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _client(self):
+        if self._redis is None:
+            self._redis = self._redis_client_factory()
+        return self._redis
+
+    def record(self, goal: str, current_skills: List[str], duration_weeks: int):
+        digest = key_digest(canonical_key(goal, current_skills, duration_weeks))
+        with self._lock:
+            self._counts[digest] += 1
+            if digest not in self._requests:
+                self._requests[digest] = orjson.dumps(
+                    {"goal": goal, "current_skills": current_skills, "duration_weeks": duration_weeks}
+                )
+            self._pending += 1
+            due = self._pending >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Writes the aggregated counts to the current hour's sorted set. Best-effort."""
+        with self._lock:
+            counts, requests = self._counts, self._requests
+            self._counts, self._requests = Counter(), {}
+            self._pending = 0
+            self._last_flush = time.monotonic()
+        if not counts:
+            return
+        bucket = f"{POPULARITY_PREFIX}{_hour_bucket(time.time())}"
+        ttl = (self.window_hours + 1) * 3600
+        try:
+            pipe = self._client().pipeline(transaction=False)
+            for digest, count in counts.items():
+                pipe.zincrby(bucket, count, digest)
+            pipe.expire(bucket, ttl)
+            # digest -> original request, kept per hour so it expires with the counts
+            for digest, request in requests.items():
+                pipe.hsetnx(_requests_key(bucket), digest, request)
+            pipe.expire(_requests_key(bucket), ttl)
+            pipe.execute()
+        except Exception as e:
+            print(f"[Materialized] Could not record popularity: {e}")
+
+    def top(self, n: int) -> List[Dict[str, Any]]:
+        """The n most requested requests over the last window_hours, most popular first."""
+        client = self._client()
+        now = _hour_bucket(time.time())
+        buckets = [f"{POPULARITY_PREFIX}{hour}" for hour in range(now - self.window_hours + 1, now + 1)]
+        totals: Counter = Counter()
+        for bucket in buckets:
+            for digest, score in client.zrevrange(bucket, 0, n * 4, withscores=True):
+                totals[digest] += score
+        digests = [digest for digest, _ in totals.most_common(n)]
+        if not digests:
+            return []
+        # Any bucket that counted a digest also holds its request; take the newest one
+        requests: List[Optional[bytes]] = [None] * len(digests)
+        for bucket in reversed(buckets):
+            missing = [i for i, r in enumerate(requests) if r is None]
+            if not missing:
+                break
+            for i, request in zip(missing, client.hmget(_requests_key(bucket), [digests[i] for i in missing])):
+                requests[i] = request
+        return [orjson.loads(r) for r in requests if r is not None]
+
+
+class MaterializedRoadmaps:
+    """
+    Generation-scoped store of precomputed roadmaps, with an in-process LRU in
+    front of Redis. The API re-reads the generation and the set of materialized
+    digests at most every generation_check_seconds (which bounds how long it
+    serves invalidated entries), so requests that aren't materialized cost no
+    Redis round trip.
+    """
+
+    def __init__(
+        self,
+        redis_client_factory: Callable[[], Any],
+        ttl_seconds: int = 86400,
+        max_local: int = 1024,
+        generation_check_seconds: float = 5.0
+    ):
+        self._redis_client_factory = redis_client_factory
+        self._redis = None
+        self.ttl_seconds = ttl_seconds
+        self.generation_check_seconds = generation_check_seconds
+        self.local = LRUCache(max_size=max_local, ttl_seconds=ttl_seconds)
+        self._generation = 0
+        self._members: frozenset = frozenset()
+        self._generation_checked = float("-inf")
+        self.counters = {"hits": 0, "misses": 0, "errors": 0}
+
+    def _client(self):
+        if self._redis is None:
+            self._redis = self._redis_client_factory()
+        return self._redis
+
+    def generation(self, refresh: bool = False) -> int:
+        now = time.monotonic()
+        if refresh or now - self._generation_checked >= self.generation_check_seconds:
+            client = self._client()
+            generation = int(client.get(GENERATION_KEY) or 0)
+            members = client.smembers(f"{PREFIX}{generation}:digests")
+            self._members = frozenset(m.decode() if isinstance(m, bytes) else m for m in members)
+            self._generation = generation
+            self._generation_checked = now
+        return self._generation
+
+    def _key(self, generation: int, digest: str) -> str:
+        return f"{PREFIX}{generation}:{digest}"
+
+    def get(self, goal: str, current_skills: List[str], duration_weeks: int) -> Optional[Dict[str, Any]]:
+        """The precomputed roadmap for a request in the current generation, or None."""
+        digest = key_digest(canonical_key(goal, current_skills, duration_weeks))
+        try:
+            generation = self.generation()
+            if digest not in self._members:
+                self.counters["misses"] += 1
+                return None
+            key = self._key(generation, digest)
+            value = self.local.get(key)
+            if value is None:
+                raw = self._client().get(key)
+                if raw is not None:
+                    value = result_codec.loads(raw)
+                    self.local.set(key, value)
+        except Exception as e:
+            print(f"[Materialized] Lookup failed: {e}")
+            self.counters["errors"] += 1
+            return None
+        self.counters["hits" if value is not None else "misses"] += 1
+        return value
+
+    def put(self, generation: int, goal: str, current_skills: List[str], duration_weeks: int, roadmap: Dict[str, Any]):
+        digest = key_digest(canonical_key(goal, current_skills, duration_weeks))
+        pipe = self._client().pipeline()
+        pipe.set(self._key(generation, digest), result_codec.dumps(roadmap), ex=self.ttl_seconds)
+        pipe.sadd(f"{PREFIX}{generation}:digests", digest)
+        pipe.expire(f"{PREFIX}{generation}:digests", self.ttl_seconds)
+        pipe.execute()
+
+    def touch(self, generation: int, goal: str, current_skills: List[str], duration_weeks: int) -> bool:
+        """Extends an existing entry's TTL; False if the request isn't materialized in this generation."""
+        digest = key_digest(canonical_key(goal, current_skills, duration_weeks))
+        if not self._client().expire(self._key(generation, digest), self.ttl_seconds):
+            return False
+        self._client().expire(f"{PREFIX}{generation}:digests", self.ttl_seconds)
+        return True
+
+    def invalidate(self) -> int:
+        """Starts a new generation; entries of the old one are no longer served."""
+        generation = int(self._client().incr(GENERATION_KEY))
+        self._generation = generation
+        self._members = frozenset()
+        self._generation_checked = time.monotonic()
+        self.local.clear()
+        print(f"[Materialized] Invalidated precomputed roadmaps (generation {generation})")
+        return generation
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "generation": self._generation,
+            "materialized": len(self._members),
+            "local_size": len(self.local)
+        }
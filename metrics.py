@@ -0,0 +1,110 @@
+"""
+Prometheus metrics for the roadmap pipeline.
+
+The API exposes them at GET /metrics; Celery workers serve them from a sidecar
+HTTP port (WORKER_METRICS_PORT). Prefork worker children write to
+PROMETHEUS_MULTIPROC_DIR so the parent can aggregate them.
+"""
+
+import os
+import time
+from functools import wraps
+from typing import Callable, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+from prometheus_client import multiprocess
+
+# Agent nodes are fast with the mock retriever and slow with real RAG/LLM calls
+_NODE_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+NODE_LATENCY = Histogram(
+    "roadmap_agent_node_seconds", "Latency of each LangGraph agent node", ["node"], buckets=_NODE_BUCKETS
+)
+QUEUE_WAIT = Histogram(
+    "roadmap_task_queue_wait_seconds", "Time between task publish and worker start", ["task"]
+)
+TASK_RUNTIME = Histogram(
+    "roadmap_task_runtime_seconds", "Task execution time on the worker", ["task"], buckets=_NODE_BUCKETS
+)
+RESULT_BACKEND_WRITE = Histogram(
+    "roadmap_result_backend_write_seconds", "Time to store a task result in the result backend", ["task"],
+    buckets=_NODE_BUCKETS
+)
+TASK_POLLS = Counter(
+    "roadmap_task_polls_total", "GET /tasks/{task_id} polls by reported status", ["status"]
+)
+ADMISSION_REJECTED = Counter(
+    "roadmap_admission_rejected_total", "Requests rejected with 429 by admission control", ["reason"]
+)
+COALESCED = Counter(
+    "roadmap_coalesced_requests_total", "Requests that shared an in-flight identical job", ["path"]
+)
+RETRIEVAL_QUERIES = Counter(
+    "roadmap_retrieval_queries_total", "Fan-out retrieval queries by outcome (ok, timeout, error)", ["outcome"]
+)
+BACKPRESSURE_DECISIONS = Counter(
+    "roadmap_backpressure_decisions_total", "Adaptive admission decisions (admit, defer, shed)", ["queue", "action"]
+)
+
+# Scaling signals, set by the backpressure sampler (python backpressure.py)
+QUEUE_DEPTH = Gauge("roadmap_queue_depth", "Messages waiting in a broker queue", ["queue"], multiprocess_mode="max")
+QUEUE_OLDEST_AGE = Gauge(
+    "roadmap_queue_oldest_age_seconds", "Age of the oldest message in a broker queue", ["queue"],
+    multiprocess_mode="max"
+)
+QUEUE_ESTIMATED_WAIT = Gauge(
+    "roadmap_queue_estimated_wait_seconds", "Estimated wait for a task published now, by priority (normal, deferred)",
+    ["queue", "priority"],
+    multiprocess_mode="max"
+)
+WORKER_UTILIZATION = Gauge(
+    "roadmap_worker_utilization", "Busy share of all worker pool slots", multiprocess_mode="max"
+)
+WORKER_DESIRED_CONCURRENCY = Gauge(
+    "roadmap_worker_desired_concurrency", "Pool slots needed to drain the backlog within the target wait",
+    multiprocess_mode="max"
+)
+
+
+def timed_node(name: str) -> Callable:
+    """Decorator recording an agent node's latency."""
+    histogram = NODE_LATENCY.labels(node=name)
+
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def _registry():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    from prometheus_client import REGISTRY
+    return REGISTRY
+
+
+def render_latest() -> Tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, with its content type."""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int):
+    """Serves metrics on a sidecar HTTP port (used by Celery workers)."""
+    start_http_server(port, registry=_registry())
+    print(f"[Metrics] Serving Prometheus metrics on :{port}")
@@ -0,0 +1,144 @@
+"""
+Data-driven prerequisite graph.
+
+Topics and their direct prerequisites are loaded once from a JSON file into a
+DAG. Topic ids are interned as small integers, transitive closures are
+precomputed as bitsets and topics are ranked in topological order, so each
+request is a handful of integer operations regardless of graph size.
+"""
+
+import json
+import os
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prerequisites.json")
+
+_TOKEN_RE = re.compile(r"[a-z0-9+#.\-]+")
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class PrerequisiteGraph:
+    """Immutable prerequisite DAG with bitset transitive closures."""
+
+    def __init__(self, topics: Dict[str, Dict]):
+        self.keys: List[str] = list(topics)
+        self.ids: Dict[str, int] = {key: i for i, key in enumerate(self.keys)}
+        self.names: List[str] = [topics[k].get("name", k) for k in self.keys]
+        self.whys: List[str] = [topics[k].get("why", "") for k in self.keys]
+
+        requires: List[List[int]] = []
+        for key in self.keys:
+            unknown = [r for r in topics[key].get("requires", []) if r not in self.ids]
+            if unknown:
+                raise ValueError(f"Topic '{key}' requires unknown topics: {unknown}")
+            requires.append([self.ids[r] for r in topics[key].get("requires", [])])
+        self.requires = requires
+
+        # Lookup table from names/aliases to ids
+        self.aliases: Dict[str, int] = {}
+        for key, i in self.ids.items():
+            for alias in [key, topics[key].get("name", key)] + topics[key].get("aliases", []):
+                self.aliases[_normalize(alias)] = i
+
+        self.rank = self._topological_rank()
+        order = sorted(range(len(self.keys)), key=self.rank.__getitem__)
+        # Closures in topological order: prerequisites are complete before dependents
+        self.closure: List[int] = [0] * len(self.keys)
+        for i in order:
+            mask = 0
+            for r in requires[i]:
+                mask |= (1 << r) | self.closure[r]
+            self.closure[i] = mask
+
+    def _topological_rank(self) -> List[int]:
+        """Kahn's algorithm; raises on cycles."""
+        n = len(self.keys)
+        dependents: List[List[int]] = [[] for _ in range(n)]
+        indegree = [len(r) for r in self.requires]
+        for i, reqs in enumerate(self.requires):
+            for r in reqs:
+                dependents[r].append(i)
+        ready = deque(i for i in range(n) if indegree[i] == 0)
+        rank = [0] * n
+        position = 0
+        while ready:
+            i = ready.popleft()
+            rank[i] = position
+            position += 1
+            for d in dependents[i]:
+                indegree[d] -= 1
+                if indegree[d] == 0:
+                    ready.append(d)
+        if position != n:
+            cyclic = [self.keys[i] for i in range(n) if indegree[i] > 0]
+            raise ValueError(f"Prerequisite graph has a cycle involving: {cyclic}")
+        return rank
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_PATH) -> "PrerequisiteGraph":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f)["topics"])
+
+    def match(self, text: str) -> List[int]:
+        """Topic ids mentioned in free text (whole string, then individual tokens)."""
+        normalized = _normalize(text)
+        if normalized in self.aliases:
+            return [self.aliases[normalized]]
+        found = []
+        for token in _TOKEN_RE.findall(normalized):
+            i = self.aliases.get(token.strip(".-"))
+            if i is not None and i not in found:
+                found.append(i)
+        return found
+
+    def known_mask(self, skills: Iterable[str]) -> int:
+        """Bitset of topics covered by the given skills (a skill implies its prerequisites)."""
+        mask = 0
+        for skill in skills:
+            for i in self.match(skill):
+                mask |= (1 << i) | self.closure[i]
+        return mask
+
+    def missing_prerequisites(self, goal: str, skills: Iterable[str]) -> Optional[List[int]]:
+        """
+        Topologically ordered ids of the goal's transitive prerequisites that the
+        skills don't cover, or None when the goal matches no known topic.
+        """
+        goal_ids = self.match(goal)
+        if not goal_ids:
+            return None
+        needed = 0
+        goal_mask = 0
+        for i in goal_ids:
+            needed |= self.closure[i]
+            goal_mask |= 1 << i
+        missing = needed & ~self.known_mask(skills) & ~goal_mask
+        ids = []
+        while missing:
+            low = missing & -missing
+            ids.append(low.bit_length() - 1)
+            missing ^= low
+        ids.sort(key=self.rank.__getitem__)
+        return ids
+
+    def direct_prerequisites(self, goal: str) -> List[int]:
+        ids: List[int] = []
+        for i in self.match(goal):
+            ids.extend(r for r in self.requires[i] if r not in ids)
+        return ids
+
+
+_graph: Optional[PrerequisiteGraph] = None
+
+
+def get_graph() -> PrerequisiteGraph:
+    """Get or load the process-wide prerequisite graph (PREREQUISITES_PATH overrides the file)."""
+    global _graph
+    if _graph is None:
+        _graph = PrerequisiteGraph.load(os.getenv("PREREQUISITES_PATH", DEFAULT_PATH))
+    return _graph
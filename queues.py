@@ -0,0 +1,102 @@
+"""
+Celery queue layout and weighted dequeueing.
+
+Interactive single-roadmap tasks, bulk cohort chunks and maintenance work
+(index builds, precomputing popular roadmaps) are routed to separate queues so
+a burst of one kind cannot starve the others. Workers consume all three
+through WeightedQueueCycle, which kombu's Redis transport uses to decide the
+order in which queues are polled.
+
+Priority bands and queue weights: messages also carry a broker priority, and
+kombu keeps one Redis list per (queue, priority step). A worker's BRPOP lists
+every band of every queue, band-major: all queues' priority-0 lists first,
+then all priority-3 lists, and so on. So a lower band is only served once
+every queue is empty at the bands above it, and the weighted cycle orders
+queues within a band. The bands are assigned so that this stays fair:
+
+    0  interactive tasks of tenants within their fair share
+    3  bulk chunks, maintenance tasks and mildly demoted interactive tenants
+       (they share this band by queue weight)
+    6  heavily demoted interactive tenants
+    9  work deferred by backpressure (see backpressure.py)
+
+Bulk and maintenance work therefore never jumps ahead of in-share interactive
+requests (which admission control and backpressure keep bounded), and demoted
+tenants compete with bulk work by weight instead of being starved by it.
+"""
+
+import os
+from typing import Dict, Iterable, List
+
+INTERACTIVE_QUEUE = "interactive"
+BULK_QUEUE = "bulk"
+MAINTENANCE_QUEUE = "maintenance"
+
+# Message priorities on the Redis broker: 0 is served first (bands above)
+PRIORITY_STEPS = [0, 3, 6, 9]
+INTERACTIVE_PRIORITY = PRIORITY_STEPS[0]
+BACKGROUND_PRIORITY = PRIORITY_STEPS[1]
+DEFERRED_PRIORITY = PRIORITY_STEPS[-1]
+
+# Routes also set the default priority; an explicit apply_async(priority=...) overrides it
+TASK_ROUTES = {
+    "generate_roadmap_task": {"queue": INTERACTIVE_QUEUE, "priority": INTERACTIVE_PRIORITY},
+    "generate_roadmap_batch_task": {"queue": BULK_QUEUE, "priority": BACKGROUND_PRIORITY},
+    "tasks.initialize_rag_index": {"queue": MAINTENANCE_QUEUE, "priority": BACKGROUND_PRIORITY},
+    "materialize_popular_roadmaps": {"queue": MAINTENANCE_QUEUE, "priority": BACKGROUND_PRIORITY},
+}
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Parses "name=weight,name=weight" (as used by QUEUE_WEIGHTS / TENANT_WEIGHTS / BACKPRESSURE_*)."""
+    weights: Dict[str, float] = {}
+    for item in spec.split(","):
+        name, sep, weight = item.partition("=")
+        if sep and name.strip():
+            weights[name.strip()] = float(weight)
+    return weights
+
+
+QUEUE_WEIGHTS = parse_weights(os.getenv("QUEUE_WEIGHTS", "interactive=6,bulk=3,maintenance=1"))
+
+
+class WeightedQueueCycle:
+    """
+    Smooth weighted round-robin over the consumed queues.
+    Plugs into kombu's Redis transport via the queue_order_strategy transport
+    option: consume() gives the BRPOP key order (the queue owed the most service
+    first) and rotate() is called with the queue a message was taken from.
+    Idle queues don't accumulate credit beyond one round, so a queue that was
+    empty for a while cannot monopolize the worker when it fills up again.
+    """
+
+    def __init__(self, it: Iterable[str] = None, weights: Dict[str, float] = None):
+        self.items: List[str] = list(it) if it is not None else []
+        self.weights = weights if weights is not None else QUEUE_WEIGHTS
+        self.current: Dict[str, float] = {q: 0.0 for q in self.items}
+
+    def _weight(self, queue: str) -> float:
+        return self.weights.get(queue, 1.0)
+
+    def update(self, it: Iterable[str]):
+        """Update items from iterable."""
+        self.items[:] = it
+        self.current = {q: self.current.get(q, 0.0) for q in self.items}
+
+    def consume(self, n: int) -> List[str]:
+        """Queues in polling order."""
+        return sorted(
+            self.items, key=lambda q: self.current.get(q, 0.0) + self._weight(q), reverse=True
+        )[:n]
+
+    def rotate(self, last_used: str):
+        """Charge the queue a message was taken from and credit the others."""
+        if last_used not in self.current:
+            return
+        total = sum(self._weight(q) for q in self.items)
+        for q in self.items:
+            self.current[q] = min(self.current[q] + self._weight(q), total)
+        self.current[last_used] = max(self.current[last_used] - total, -total)
+
+    def close(self):
+        """Close cycle."""
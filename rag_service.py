@@ -1,31 +1,200 @@
 import os
-from typing import List, Dict
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings, StorageContext
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.vector_stores.chroma import ChromaVectorStore
-import chromadb
+import json
+import fcntl
+import tempfile
+import asyncio
+import math
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Dict, Any
+from embedding_cache import EmbeddingCache, MicroBatcher
+from chroma_async import AsyncChromaRetriever, run_sync
+from vector_index import LocalVectorIndex
 
-# Use a local embedding model to avoid API key requirements for this MVP
-Settings.embedding_model = HuggingFaceEmbedding(model_name="BAAI/bge-small-en-v1.5")
+# llama_index, chromadb and the HuggingFace model are imported on first use:
+# they take seconds to load, and the API imports this module's callers without
+# ever retrieving. Workers load them once in the Celery parent (preload).
 
+EMBED_MODEL_NAME = "BAAI/bge-small-en-v1.5"
+
+_embed_model = None
+_embedding_batcher = None
+_embedding_cache = None
+_model_lock = threading.Lock()
 _index = None
 _chroma_client = None
+_chroma_collection = None
+_async_retriever = None
+_local_index = None
+_index_listeners: List[Callable[[Dict[str, int]], None]] = []
+
+SIMILARITY_TOP_K = 3
+# "chroma" queries the Chroma server; "local" searches an exported, memory-mapped copy in-process
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", os.path.join("data", ".vector_index"))
+QUERY_TEMPLATE = "What are the key concepts and resources for learning {goal}?"
+
+def get_embed_model():
+    """
+    Get or load the local embedding model (no API key needed for this MVP) and
+    register it as llama_index's default embed_model.
+    """
+    global _embed_model
+    if _embed_model is None:
+        with _model_lock:
+            if _embed_model is None:
+                from llama_index.core import Settings
+                from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+                start = time.perf_counter()
+                model = HuggingFaceEmbedding(model_name=EMBED_MODEL_NAME)
+                Settings.embed_model = model
+                _embed_model = model
+                print(f"[RAG] Loaded embedding model {EMBED_MODEL_NAME} in {time.perf_counter() - start:.2f}s")
+    return _embed_model
+
+def get_embedding_cache() -> EmbeddingCache:
+    """
+    Get or create the query embedding cache: concurrent misses share one forward
+    pass, repeats are served from cache.
+    """
+    global _embedding_batcher, _embedding_cache
+    if _embedding_cache is None:
+        embed_model = get_embed_model()
+        with _model_lock:
+            if _embedding_cache is None:
+                # Query path: applies the model's query instruction, which bge expects
+                # on queries and get_text_embedding_batch (the document path) leaves out
+                _embedding_batcher = MicroBatcher(
+                    embed_model._get_query_embeddings,
+                    max_batch=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+                    max_wait_ms=float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+                )
+                _embedding_cache = EmbeddingCache(
+                    model_name=f"{EMBED_MODEL_NAME}:query",
+                    embed_fn=_embedding_batcher.embed,
+                    embed_many_fn=_embedding_batcher.embed_many,
+                    max_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "4096")),
+                    disk_path=os.getenv("EMBEDDING_CACHE_PATH") or None
+                )
+    return _embedding_cache
+
+def preload():
+    """
+    Imports the ML stack and loads the embedding model. Called in the Celery parent
+    before the pool forks, so children share the model's pages copy-on-write.
+    No inference runs here: the torch thread pool must not exist before fork.
+    """
+    get_embedding_cache()
+    import chromadb  # noqa: F401
+    from llama_index.vector_stores.chroma import ChromaVectorStore  # noqa: F401
 
 def get_chroma_client():
     """Get or create the ChromaDB client."""
     global _chroma_client
     if _chroma_client is None:
+        import chromadb
         chroma_host = os.getenv("CHROMA_HOST", "localhost")
         chroma_port = int(os.getenv("CHROMA_PORT", "8000"))
         _chroma_client = chromadb.HttpClient(host=chroma_host, port=chroma_port)
     return _chroma_client
 
-def build_sample_index(data_dir: str = "data", force_reload: bool = False):
+def _file_sha256(path: str) -> str:
+    """Content hash of a source file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _chunk_id(source_path: str, text: str) -> str:
+    """Content-addressed chunk id: unchanged chunks keep their id across re-ingests."""
+    return hashlib.sha256(f"{source_path}\x00{text}".encode("utf-8")).hexdigest()
+
+def _list_source_files(data_dir: str) -> Dict[str, str]:
+    """Maps data_dir-relative paths of all non-hidden files to their absolute paths."""
+    files = {}
+    for root, dirs, names in os.walk(data_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in names:
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            files[os.path.relpath(path, data_dir)] = os.path.abspath(path)
+    return files
+
+def _manifest_path(data_dir: str) -> str:
+    return os.getenv("INDEX_MANIFEST_PATH") or os.path.join(data_dir, ".index_manifest.json")
+
+def _load_manifest(data_dir: str, chroma_collection) -> Dict[str, Dict[str, Any]]:
+    """
+    Loads {source_path: {"file_hash", "chunk_ids"}} from disk. If the file is missing
+    (e.g. a fresh container) or doesn't match the collection (e.g. Chroma was wiped
+    or restored), rebuilds it from chunk metadata stored in Chroma.
+    """
+    manifest: Dict[str, Dict[str, Any]] = {}
+    if chroma_collection.count() == 0:
+        return manifest
+
+    path = _manifest_path(data_dir)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            manifest = json.load(f)
+        chunk_ids = [chunk_id for entry in manifest.values() for chunk_id in entry["chunk_ids"]]
+        found = chroma_collection.get(ids=chunk_ids, include=[])["ids"] if chunk_ids else []
+        if len(set(found)) == len(set(chunk_ids)):
+            return manifest
+        print(f"[RAG] Manifest {path} lists chunks missing from Chroma; rebuilding it from the collection")
+        manifest = {}
+    
+    existing = chroma_collection.get(include=["metadatas"])
+    for chunk_id, metadata in zip(existing["ids"], existing["metadatas"]):
+        source_path = (metadata or {}).get("source_path")
+        if source_path is None:
+            # Chunks from the pre-manifest layout carry no hash; drop them so they get re-ingested
+            source_path = ""
+        entry = manifest.setdefault(source_path, {"file_hash": (metadata or {}).get("file_hash"), "chunk_ids": []})
+        entry["chunk_ids"].append(chunk_id)
+    return manifest
+
+def _save_manifest(data_dir: str, manifest: Dict[str, Dict[str, Any]]):
+    path = _manifest_path(data_dir)
+    fd, tmp_path = tempfile.mkstemp(prefix=".index_manifest.", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+@contextmanager
+def _manifest_lock(data_dir: str):
+    """Serializes index syncs that share a manifest (workers, API, CLI)."""
+    with open(f"{_manifest_path(data_dir)}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def add_index_listener(listener: Callable[[Dict[str, int]], None]):
+    """Registers listener(stats), called whenever build_sample_index adds or deletes chunks."""
+    _index_listeners.append(listener)
+
+def build_sample_index(data_dir: str = "data", force_reload: bool = False) -> Dict[str, int]:
     """
-    Loads documents from the data directory and builds a vector index in ChromaDB.
-    If the collection already exists and has data, skips reloading unless force_reload=True.
+    Incrementally syncs the data directory into the ChromaDB collection.
+    Files and chunks are content-hashed: only new or changed chunks are embedded and
+    upserted, chunks of removed files are deleted, and unchanged files cost nothing.
+    force_reload=True discards the manifest and re-ingests everything.
+    Returns counts of added, deleted and unchanged chunks.
     """
-    global _index
+    global _index, _chroma_collection
+    from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings, StorageContext
+    from llama_index.vector_stores.chroma import ChromaVectorStore
+    get_embed_model()
     
     if not os.path.exists(data_dir):
         os.makedirs(data_dir, exist_ok=True)
@@ -36,47 +205,202 @@ def build_sample_index(data_dir: str = "data", force_reload: bool = False):
     
     # Get or create collection
     chroma_collection = chroma_client.get_or_create_collection(collection_name)
+    _chroma_collection = chroma_collection
+    vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+    storage_context = StorageContext.from_defaults(vector_store=vector_store)
+    _index = VectorStoreIndex.from_vector_store(vector_store, storage_context=storage_context)
     
-    # Check if collection already has documents
-    if chroma_collection.count() > 0 and not force_reload:
-        print(f"ChromaDB collection '{collection_name}' already has {chroma_collection.count()} documents. Skipping reload.")
-        # Just create the index from existing collection
-        vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-        storage_context = StorageContext.from_defaults(vector_store=vector_store)
-        _index = VectorStoreIndex.from_vector_store(vector_store, storage_context=storage_context)
-        return
+    with _manifest_lock(data_dir):
+        if force_reload:
+            existing_ids = chroma_collection.get(include=[])["ids"]
+            if existing_ids:
+                chroma_collection.delete(ids=existing_ids)
+            manifest: Dict[str, Dict[str, Any]] = {}
+        else:
+            manifest = _load_manifest(data_dir, chroma_collection)
     
-    # Load documents and build index
-    documents = SimpleDirectoryReader(data_dir).load_data()
+        source_files = _list_source_files(data_dir)
+        stats = {"added": 0, "deleted": 0, "unchanged": 0}
     
-    # Create vector store
-    vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-    storage_context = StorageContext.from_defaults(vector_store=vector_store)
+        # Delete chunks whose source file was removed
+        for source_path in [p for p in manifest if p not in source_files]:
+            stale_ids = manifest.pop(source_path)["chunk_ids"]
+            if stale_ids:
+                chroma_collection.delete(ids=stale_ids)
+            stats["deleted"] += len(stale_ids)
     
-    # Build index
-    _index = VectorStoreIndex.from_documents(documents, storage_context=storage_context)
-    print(f"Index built with {len(documents)} documents and stored in ChromaDB.")
+        # Re-chunk only files whose content hash changed
+        file_hashes = {rel: _file_sha256(path) for rel, path in source_files.items()}
+        changed = [rel for rel in source_files if manifest.get(rel, {}).get("file_hash") != file_hashes[rel]]
+        for rel in source_files:
+            if rel not in changed:
+                stats["unchanged"] += len(manifest[rel]["chunk_ids"])
+    
+        if changed:
+            documents = SimpleDirectoryReader(input_files=[source_files[rel] for rel in changed]).load_data()
+            new_nodes = []
+            for rel in changed:
+                old_ids = set(manifest.get(rel, {}).get("chunk_ids", []))
+                docs = [d for d in documents if os.path.abspath(d.metadata.get("file_path", "")) == source_files[rel]]
+                chunk_ids = []
+                for node in Settings.node_parser.get_nodes_from_documents(docs):
+                    chunk_id = _chunk_id(rel, node.get_content())
+                    if chunk_id in chunk_ids:
+                        continue
+                    chunk_ids.append(chunk_id)
+                    if chunk_id in old_ids:
+                        continue
+                    node.id_ = chunk_id
+                    node.metadata["source_path"] = rel
+                    node.metadata["file_hash"] = file_hashes[rel]
+                    new_nodes.append(node)
+            
+                removed_ids = list(old_ids - set(chunk_ids))
+                if removed_ids:
+                    chroma_collection.delete(ids=removed_ids)
+                stats["deleted"] += len(removed_ids)
+                stats["unchanged"] += len(old_ids) - len(removed_ids)
+                manifest[rel] = {"file_hash": file_hashes[rel], "chunk_ids": chunk_ids}
+        
+            # Only the new chunks are embedded
+            if new_nodes:
+                _index.insert_nodes(new_nodes)
+            stats["added"] = len(new_nodes)
+    
+        _save_manifest(data_dir, manifest)
+    _refresh_local_index(chroma_collection)
+    print(f"Index synced into ChromaDB collection '{collection_name}': "
+          f"{stats['added']} added, {stats['deleted']} deleted, {stats['unchanged']} unchanged chunks.")
+    if stats["added"] or stats["deleted"]:
+        for listener in _index_listeners:
+            listener(stats)
+    return stats
+
+def get_async_retriever() -> AsyncChromaRetriever:
+    """Get or create the pooled async retriever for the learning_resources collection."""
+    global _async_retriever
+    if _async_retriever is None:
+        _async_retriever = AsyncChromaRetriever(
+            host=os.getenv("CHROMA_HOST", "localhost"),
+            port=int(os.getenv("CHROMA_PORT", "8000")),
+            collection_name="learning_resources",
+            pool_size=int(os.getenv("CHROMA_POOL_SIZE", "4")),
+            max_concurrency=int(os.getenv("CHROMA_MAX_CONCURRENCY", "32")),
+            timeout=float(os.getenv("CHROMA_QUERY_TIMEOUT_MS", "2000")) / 1000,
+            hedge=os.getenv("CHROMA_HEDGE", "true").lower() == "true"
+        )
+    return _async_retriever
 
-def query_resources(goal: str) -> List[Dict[str, str]]:
+def _refresh_local_index(chroma_collection):
     """
-    Queries the index for the given goal and returns top 3 resources.
+    Exports the collection into the in-process index. With VECTOR_BACKEND=local it
+    is saved to LOCAL_INDEX_PATH and memory-mapped; it also serves as the async
+    retriever's fallback snapshot when CHROMA_SNAPSHOT is enabled.
     """
-    global _index
-    if _index is None:
-        build_sample_index()
+    global _local_index
+    use_snapshot = os.getenv("CHROMA_SNAPSHOT", "true").lower() == "true"
+    if VECTOR_BACKEND != "local" and not use_snapshot:
+        return
+    try:
+        index = LocalVectorIndex.from_collection(chroma_collection)
+    except Exception as e:
+        print(f"[VectorIndex] Could not export collection: {e}")
+        return
+    if VECTOR_BACKEND == "local":
+        index.save(LOCAL_INDEX_PATH)
+        index = LocalVectorIndex.load(LOCAL_INDEX_PATH)
+        _local_index = index
+    if use_snapshot:
+        get_async_retriever().snapshot = index
+
+def get_local_index() -> LocalVectorIndex:
+    """
+    Get the memory-mapped local index, loading it from LOCAL_INDEX_PATH (or
+    syncing from Chroma if it was never exported).
+    Pages are file-backed, so all worker processes share one physical copy.
+    """
+    global _local_index
+    if _local_index is None:
+        if os.path.exists(f"{LOCAL_INDEX_PATH}.json"):
+            _local_index = LocalVectorIndex.load(LOCAL_INDEX_PATH)
+        else:
+            build_sample_index()
+    return _local_index
+
+def _format_query_response(response) -> List[List[Dict[str, Any]]]:
+    """Converts a Chroma multi-query response into one resource list per query."""
+    batch_results = []
+    for documents, metadatas, distances in zip(response["documents"], response["metadatas"], response["distances"]):
+        results = []
+        for text, metadata, distance in zip(documents, metadatas, distances):
+            # In a real app, we'd parse metadata better. 
+            # Here we just take a snippet of the text.
+            content_preview = (text or "")[:200].replace("\n", " ")
+            results.append({
+                "title": f"Resource from {(metadata or {}).get('file_name', 'doc')}",
+                "snippet": content_preview + "...",
+                # Lets fan-out retrieval count chunks of one file once
+                "source": (metadata or {}).get("source_path") or (metadata or {}).get("file_name"),
+                # Same distance-to-similarity mapping as the llama_index Chroma store
+                "score": math.exp(-distance)
+            })
+        batch_results.append(results)
+    return batch_results
+
+def embed_query(text: str) -> List[float]:
+    """Embeds a query string through the embedding cache."""
+    return get_embedding_cache().get(text)
+
+def _embed_queries(queries: List[str]) -> List[List[float]]:
+    # Resolves the cache inside the executor thread: the first call loads the model
+    return get_embedding_cache().get_many(queries)
+
+async def aquery_resources_batch(goals: List[str]) -> List[List[Dict[str, Any]]]:
+    """
+    Async batched retrieval: all query embeddings are computed in one forward pass
+    and sent to Chroma as a single multi-query request through the pooled client
+    (deadline, hedging and snapshot fallback apply). No LLM is involved.
+    """
+    if not goals:
+        return []
+    loop = asyncio.get_running_loop()
+    if VECTOR_BACKEND == "local":
+        index = await loop.run_in_executor(None, get_local_index)
+        queries = [QUERY_TEMPLATE.format(goal=goal) for goal in goals]
+        embeddings = await loop.run_in_executor(None, _embed_queries, queries)
+        return _format_query_response(index.query(embeddings, SIMILARITY_TOP_K))
     
-    query_engine = _index.as_query_engine(similarity_top_k=3)
-    response = query_engine.query(f"What are the key concepts and resources for learning {goal}?")
+    if _chroma_collection is None:
+        await loop.run_in_executor(None, build_sample_index)
     
-    # Extract source nodes to get "titles" or snippets
-    results = []
-    for node in response.source_nodes:
-        # In a real app, we'd parse metadata better. 
-        # Here we just take a snippet of the text.
-        content_preview = node.node.get_content()[:200].replace("\n", " ")
-        results.append({
-            "title": f"Resource from {node.node.metadata.get('file_name', 'doc')}",
-            "snippet": content_preview + "..."
-        })
-        
-    return results
+    queries = [QUERY_TEMPLATE.format(goal=goal) for goal in goals]
+    embeddings = await loop.run_in_executor(None, _embed_queries, queries)
+    response = await get_async_retriever().query(embeddings, SIMILARITY_TOP_K)
+    return _format_query_response(response)
+
+async def aquery_resources(goal: str) -> List[Dict[str, Any]]:
+    """Async variant of query_resources."""
+    return (await aquery_resources_batch([goal]))[0]
+
+def query_resources_batch(goals: List[str]) -> List[List[Dict[str, Any]]]:
+    """
+    Batched variant of query_resources. Returns one result list per goal,
+    in the same format as query_resources.
+    """
+    if not goals:
+        return []
+    if VECTOR_BACKEND == "local":
+        # In-process search: no network hop and no event loop round-trip
+        queries = [QUERY_TEMPLATE.format(goal=goal) for goal in goals]
+        embeddings = _embed_queries(queries)
+        return _format_query_response(get_local_index().query(embeddings, SIMILARITY_TOP_K))
+    if _chroma_collection is None:
+        build_sample_index()
+    return run_sync(aquery_resources_batch(goals))
+
+def query_resources(goal: str) -> List[Dict[str, Any]]:
+    """
+    Queries the index for the given goal and returns top 3 resources.
+    Runs on the async retrieval layer, so the call is bounded by its deadline.
+    """
+    return query_resources_batch([goal])[0]
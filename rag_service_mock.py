@@ -1,8 +1,21 @@
 """
 Simplified RAG service for quick testing without heavy ML dependencies.
+
+Lookups go through an in-memory inverted index: topic names, titles and text
+(built-in topics plus every data/*.md file) are tokenized into BM25-weighted
+postings, with a trigram index on topic names as a fuzzy fallback
+("reactjs", "javascrpt"). A topic only matches when a query word (other than
+stopwords and generic study words) is in its name or title; body text ranks
+the matches but never selects a topic on its own, so unrelated goals get the
+generic default. Result tuples are prebuilt once per topic and lookups are
+memoized per goal.
 """
 import os
-from typing import List, Dict
+import re
+import math
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Callable, List, Dict, Tuple, Sequence, Optional
 
 _mock_data = {
     "react": [
@@ -22,24 +35,206 @@ _mock_data = {
     ]
 }
 
+# BM25 parameters and per-field boosts (a topic's name matters more than its body text)
+BM25_K1 = 1.2
+BM25_B = 0.75
+NAME_BOOST = 5
+TITLE_BOOST = 3
+TRIGRAM_THRESHOLD = 0.5
+QUERY_CACHE_SIZE = 65536
+
+_TOKEN_RE = re.compile(r"[a-z0-9+#]+")
+
+# Words that say nothing about the topic ("learn X for beginners", "React.js")
+STOPWORDS = frozenset("""
+a an and as at be by for from how i in into is it of on or the to want what with my me
+learn learning study studying master mastering become understand get started getting
+guide guides tutorial tutorials course courses basics basic fundamentals fundamental beginner beginners
+intro introduction overview advanced complete best practices practice beginning step js
+""".split())
+
+ResultTuple = Tuple[Dict[str, str], ...]
+
+
+def _tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _keywords(text: str) -> List[str]:
+    return [token for token in _tokenize(text) if token not in STOPWORDS]
+
+
+def _trigrams(token: str) -> set:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _parse_markdown(name: str, text: str) -> Tuple[str, ResultTuple]:
+    """Derives a title and three resource entries from a data/*.md topic file."""
+    lines = [line.strip() for line in text.splitlines()]
+    title = next((line[2:].strip() for line in lines if line.startswith("# ")), name)
+    overview = next((line for line in lines if line and not line.startswith(("#", "-"))), f"Learn {title}")
+
+    resources, concepts = [], []
+    section = ""
+    for line in lines:
+        if line.startswith("## "):
+            section = line[3:].lower()
+        elif line.startswith("- "):
+            item = line[2:].strip()
+            if "resource" in section:
+                resources.append({"title": item, "snippet": f"Recommended resource for {title}..."})
+            else:
+                term, _, desc = item.partition(":")
+                concepts.append({"title": f"{title}: {term.strip('* ')}", "snippet": (desc.strip() or item) + "..."})
+
+    entries = [{"title": title, "snippet": overview[:200] + "..."}] + resources + concepts
+    return title, tuple(entries[:3])
+
+
+class KeywordIndex:
+    """Immutable BM25 inverted index over topics, with a trigram fallback on topic names."""
+
+    def __init__(self, topics: Dict[str, Tuple[str, str, ResultTuple]]):
+        # topics: name -> (title, body text, results)
+        self.names = list(topics)
+        self.results: List[ResultTuple] = [topics[n][2] for n in self.names]
+
+        docs = []
+        for name in self.names:
+            title, body, _ = topics[name]
+            tf = Counter(_tokenize(body))
+            for token in _tokenize(name):
+                tf[token] += NAME_BOOST
+            for token in _tokenize(title):
+                tf[token] += TITLE_BOOST
+            docs.append(tf)
+
+        n_docs = len(docs)
+        avg_len = sum(sum(tf.values()) for tf in docs) / n_docs if n_docs else 0.0
+        df = Counter(token for tf in docs for token in tf)
+        postings = defaultdict(list)
+        for doc_id, tf in enumerate(docs):
+            doc_len = sum(tf.values())
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / avg_len)
+            for token, freq in tf.items():
+                idf = math.log(1 + (n_docs - df[token] + 0.5) / (df[token] + 0.5))
+                postings[token].append((doc_id, idf * freq * (BM25_K1 + 1) / (freq + norm)))
+        self.postings: Dict[str, Tuple[Tuple[int, float], ...]] = {t: tuple(p) for t, p in postings.items()}
+
+        # keyword -> topics whose name or title contains it
+        named = defaultdict(set)
+        for doc_id, name in enumerate(self.names):
+            for token in _keywords(name) + _keywords(topics[name][0]):
+                named[token].add(doc_id)
+        self.named: Dict[str, frozenset] = {t: frozenset(ids) for t, ids in named.items()}
+
+        trigrams = defaultdict(set)
+        for doc_id, name in enumerate(self.names):
+            for token in _keywords(name):
+                for gram in _trigrams(token):
+                    trigrams[gram].add(doc_id)
+        self.trigrams: Dict[str, frozenset] = {g: frozenset(ids) for g, ids in trigrams.items()}
+
+    def search(self, goal: str) -> Optional[ResultTuple]:
+        """Best-matching topic's results, or None when no topic name or title matches."""
+        tokens = _keywords(goal)
+        candidates = set().union(*(self.named.get(token, ()) for token in tokens))
+        if candidates:
+            scores: Dict[int, float] = defaultdict(float)
+            for token in tokens:
+                for doc_id, weight in self.postings.get(token, ()):
+                    if doc_id in candidates:
+                        scores[doc_id] += weight
+            return self.results[max(candidates, key=lambda doc_id: (scores[doc_id], -doc_id))]
+
+        # Fuzzy fallback: share of the goal's trigrams found in a topic name
+        for token in tokens:
+            grams = _trigrams(token)
+            overlap = Counter(doc_id for g in grams for doc_id in self.trigrams.get(g, ()))
+            if overlap:
+                doc_id, shared = overlap.most_common(1)[0]
+                if shared / len(grams) >= TRIGRAM_THRESHOLD:
+                    return self.results[doc_id]
+        return None
+
+
+_keyword_index: Optional[KeywordIndex] = None
+_index_listeners: List[Callable[[Dict[str, int]], None]] = []
+
+
+def _load_topics(data_dir: str) -> Dict[str, Tuple[str, str, ResultTuple]]:
+    topics = {
+        name: (name, " ".join(r["title"] + " " + r["snippet"] for r in results), tuple(results))
+        for name, results in _mock_data.items()
+    }
+    if os.path.isdir(data_dir):
+        for file_name in sorted(os.listdir(data_dir)):
+            if not file_name.endswith(".md"):
+                continue
+            name = file_name[:-3].lower()
+            with open(os.path.join(data_dir, file_name), "r", encoding="utf-8") as f:
+                text = f.read()
+            title, results = _parse_markdown(name, text)
+            if name in topics:
+                # Keep curated results, but index the richer file text too
+                _, body, results = topics[name]
+                text = body + " " + text
+            topics[name] = (title, text, results)
+    return topics
+
+
+def add_index_listener(listener: Callable[[Dict[str, int]], None]):
+    """Registers listener(stats), called when build_sample_index rebuilds an existing index."""
+    _index_listeners.append(listener)
+
+
 def build_sample_index(data_dir: str = "data", force_reload: bool = False):
-    """Mock index builder - does nothing for quick testing."""
-    print(f"[Mock] Index initialized (skipping actual ChromaDB for quick test)")
+    """Builds the in-memory keyword index from the built-in topics and data_dir/*.md."""
+    global _keyword_index
+    if _keyword_index is not None and not force_reload:
+        return
+    rebuilt = _keyword_index is not None
+    _keyword_index = KeywordIndex(_load_topics(data_dir))
+    _search.cache_clear()
+    print(f"[Mock] Keyword index built with {len(_keyword_index.names)} topics")
+    if rebuilt:
+        for listener in _index_listeners:
+            listener({"topics": len(_keyword_index.names)})
+
+
+def preload():
+    """Builds the index before the worker pool forks (same hook as rag_service.preload)."""
+    build_sample_index()
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _search(goal: str) -> ResultTuple:
+    result = _keyword_index.search(goal)
+    if result is not None:
+        return result
+    # Default response; marked so fan-out retrieval can drop it from sub-queries
+    return (
+        {
+            "title": f"Resource for {goal}",
+            "snippet": f"Learn {goal} fundamentals and best practices...",
+            "placeholder": True
+        },
+        {"title": f"{goal} Tutorial", "snippet": f"Getting started with {goal}...", "placeholder": True},
+        {"title": f"{goal} Guide", "snippet": f"Complete guide to mastering {goal}...", "placeholder": True}
+    )
 
-def query_resources(goal: str) -> List[Dict[str, str]]:
+
+def query_resources(goal: str) -> Sequence[Dict[str, str]]:
     """
-    Mock query function - returns hardcoded results based on goal.
+    Mock query function - returns the prebuilt results of the best-matching topic.
+    The returned tuple is shared between callers and must not be mutated.
     """
-    goal_lower = goal.lower()
-    
-    # Find matching mock data
-    for key in _mock_data:
-        if key in goal_lower:
-            return _mock_data[key]
-    
-    # Default response
-    return [
-        {"title": f"Resource for {goal}", "snippet": f"Learn {goal} fundamentals and best practices..."},
-        {"title": f"{goal} Tutorial", "snippet": f"Getting started with {goal}..."},
-        {"title": f"{goal} Guide", "snippet": f"Complete guide to mastering {goal}..."}
-    ]
+    if _keyword_index is None:
+        build_sample_index()
+    return _search(goal)
+
+
+def query_resources_batch(goals: List[str]) -> List[Sequence[Dict[str, str]]]:
+    """Mock batched query - one result list per goal."""
+    return [query_resources(goal) for goal in goals]
@@ -0,0 +1,128 @@
+"""
+Compact encoding for roadmap results.
+
+A roadmap repeats the same few topics, descriptions, rationales and resource
+lists across weeks, and every week repeats the same five keys. The codec
+stores each distinct string and resource list once, encodes weeks as index
+rows, and zstd-compresses the result. It is registered with kombu as the
+result serializer, so Celery's result backend stores the compact form and
+AsyncResult.result decodes it back into the usual dicts.
+"""
+
+import threading
+from typing import Any, Dict, List
+
+import orjson
+import zstandard
+
+CONTENT_TYPE = "application/x-roadmap+zstd"
+# Format marker; payloads without it are plain orjson (results stored before the codec)
+MAGIC = b"RM1"
+COMPRESSION_LEVEL = 3
+
+_ROADMAP_MARKER = "__roadmap__"
+_local = threading.local()
+
+
+def _compressor() -> zstandard.ZstdCompressor:
+    # zstandard contexts are not thread-safe; keep one per thread
+    if not hasattr(_local, "compressor"):
+        _local.compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL)
+        _local.decompressor = zstandard.ZstdDecompressor()
+    return _local.compressor
+
+
+def _decompressor() -> zstandard.ZstdDecompressor:
+    _compressor()
+    return _local.decompressor
+
+
+def _is_roadmap(value: Any) -> bool:
+    return isinstance(value, dict) and "roadmap" in value and "total_weeks" in value and len(value) == 2
+
+
+def pack_roadmap(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    {"t": total_weeks, "s": strings, "l": resource lists (string indices),
+    "w": [[week_number, topic, description, resource list, why_first], ...]}
+    where why_first is -1 for None.
+    """
+    strings: List[str] = []
+    string_ids: Dict[str, int] = {}
+    lists: List[List[int]] = []
+    list_ids: Dict[tuple, int] = {}
+
+    def intern(text: str) -> int:
+        i = string_ids.get(text)
+        if i is None:
+            i = string_ids[text] = len(strings)
+            strings.append(text)
+        return i
+
+    weeks = []
+    for week in result["roadmap"]:
+        resources = tuple(intern(r) for r in week["resources"])
+        list_id = list_ids.get(resources)
+        if list_id is None:
+            list_id = list_ids[resources] = len(lists)
+            lists.append(list(resources))
+        why = week.get("why_first")
+        weeks.append([
+            week["week_number"],
+            intern(week["topic"]),
+            intern(week["description"]),
+            list_id,
+            -1 if why is None else intern(why)
+        ])
+    return {"t": result["total_weeks"], "s": strings, "l": lists, "w": weeks}
+
+
+def unpack_roadmap(packed: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of pack_roadmap. Weeks with the same resources share one list."""
+    strings = packed["s"]
+    lists = [[strings[i] for i in resources] for resources in packed["l"]]
+    roadmap = [
+        {
+            "week_number": week_number,
+            "topic": strings[topic],
+            "description": strings[description],
+            "resources": lists[list_id],
+            "why_first": None if why < 0 else strings[why]
+        }
+        for week_number, topic, description, list_id, why in packed["w"]
+    ]
+    return {"roadmap": roadmap, "total_weeks": packed["t"]}
+
+
+def _pack(value: Any) -> Any:
+    if _is_roadmap(value):
+        return {_ROADMAP_MARKER: pack_roadmap(value)}
+    if isinstance(value, dict):
+        return {k: _pack(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_pack(v) for v in value]
+    return value
+
+
+def _unpack(value: Any) -> Any:
+    if isinstance(value, dict):
+        if len(value) == 1 and _ROADMAP_MARKER in value:
+            return unpack_roadmap(value[_ROADMAP_MARKER])
+        return {k: _unpack(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_unpack(v) for v in value]
+    return value
+
+
+def dumps(value: Any) -> bytes:
+    """Encodes any JSON-like value; roadmaps anywhere inside it are packed."""
+    return MAGIC + _compressor().compress(orjson.dumps(_pack(value)))
+
+
+def loads(data: bytes) -> Any:
+    """Decodes dumps() output (or plain JSON written before the codec)."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if not data.startswith(MAGIC):
+        return orjson.loads(data)
+    return _unpack(orjson.loads(_decompressor().decompress(data[len(MAGIC):])))
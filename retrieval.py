@@ -0,0 +1,227 @@
+"""
+Fan-out retrieval with reciprocal-rank fusion.
+
+The agent's retrieval step queries several formulations at once (the goal,
+each missing prerequisite, and the goal relative to the learner's current
+skills) against every configured source. Queries run concurrently on a
+shared thread pool under one deadline; whatever has arrived by then is fused
+by reciprocal rank, with chunks from the same source file counted once.
+Batch tasks retrieve for a whole chunk of requests at once: the distinct
+query texts of every request go to each source in one batched call (one
+embedding pass and one vector query for the RAG service), then each
+request's results are fused exactly as for a single request.
+"""
+
+import importlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import metrics
+
+# Retriever modules exposing query_resources(goal); e.g. "rag_service_mock,rag_service"
+RETRIEVAL_SOURCES = [s.strip() for s in os.getenv("RETRIEVAL_SOURCES", "rag_service_mock").split(",") if s.strip()]
+RETRIEVAL_DEADLINE_MS = float(os.getenv("RETRIEVAL_DEADLINE_MS", "1500"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+RETRIEVAL_MAX_PREREQUISITES = int(os.getenv("RETRIEVAL_MAX_PREREQUISITES", "3"))
+FANOUT_WORKERS = int(os.getenv("RETRIEVAL_FANOUT_WORKERS", "8"))
+RRF_K = 60
+
+# Relative weight of each query formulation in the fusion
+QUERY_WEIGHTS = {"goal": 1.0, "prerequisite": 0.6, "skills": 0.5}
+
+QueryFn = Callable[[str], Sequence[Dict[str, Any]]]
+BatchQueryFn = Callable[[List[str]], List[Sequence[Dict[str, Any]]]]
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_sources: Optional[List[Tuple[str, QueryFn]]] = None
+_batch_sources: Optional[List[Tuple[str, BatchQueryFn]]] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Get or create the thread pool shared by all fan-out queries in this process."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="retrieval")
+    return _executor
+
+
+def get_source_modules() -> List[ModuleType]:
+    """The retriever modules named in RETRIEVAL_SOURCES."""
+    return [importlib.import_module(name) for name in RETRIEVAL_SOURCES]
+
+
+def get_sources() -> List[Tuple[str, QueryFn]]:
+    """(name, query_resources) for each module in RETRIEVAL_SOURCES, imported on first use."""
+    global _sources
+    if _sources is None:
+        _sources = [(module.__name__, module.query_resources) for module in get_source_modules()]
+    return _sources
+
+
+def _one_by_one(query_fn: QueryFn) -> BatchQueryFn:
+    return lambda texts: [query_fn(text) for text in texts]
+
+
+def get_batch_sources() -> List[Tuple[str, BatchQueryFn]]:
+    """(name, query_resources_batch) per source; sources without one are queried text by text."""
+    global _batch_sources
+    if _batch_sources is None:
+        _batch_sources = [
+            (module.__name__, getattr(module, "query_resources_batch", None) or _one_by_one(module.query_resources))
+            for module in get_source_modules()
+        ]
+    return _batch_sources
+
+
+def build_queries(goal: str, current_skills: List[str], prerequisites: List[str]) -> List[Tuple[str, str]]:
+    """(kind, query text) formulations for a request; the goal itself comes first."""
+    queries = [("goal", goal)]
+    queries.extend(("prerequisite", name) for name in prerequisites[:RETRIEVAL_MAX_PREREQUISITES])
+    skills = [s for s in current_skills if s.strip()]
+    if skills:
+        queries.append(("skills", f"{goal} for someone who knows {', '.join(skills)}"))
+    return queries
+
+
+def resource_key(resource: Dict[str, Any]) -> str:
+    """Deduplication key: the source file when the retriever reports one, else the title."""
+    return resource.get("source") or resource["title"]
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Sequence[Tuple[float, Sequence[Dict[str, Any]]]],
+    k: int = RRF_K,
+    limit: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Fuses (weight, ranked results) lists: each resource scores the sum of
+    weight / (k + rank) over the lists it appears in. Within a list only the
+    best-ranked chunk of a source counts; the fused list keeps that chunk.
+    """
+    scores: Dict[str, float] = {}
+    best: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+    for weight, results in ranked_lists:
+        seen = set()
+        for rank, resource in enumerate(results, start=1):
+            key = resource_key(resource)
+            if key in seen:
+                continue
+            seen.add(key)
+            contribution = weight / (k + rank)
+            scores[key] = scores.get(key, 0.0) + contribution
+            if key not in best or contribution > best[key][0]:
+                best[key] = (contribution, resource)
+    ordered = sorted(scores, key=scores.__getitem__, reverse=True)
+    if limit is not None:
+        ordered = ordered[:limit]
+    return [best[key][1] for key in ordered]
+
+
+def _ranked_lists(
+    queries: List[Tuple[str, str]],
+    by_source: List[Dict[str, Sequence[Dict[str, Any]]]]
+) -> List[Tuple[float, Sequence[Dict[str, Any]]]]:
+    """
+    (weight, results) per query and source that answered, in query order.
+    Placeholder hits (a retriever's generic filler when nothing matched) are kept
+    only for the goal query, so they never outrank real hits from the sub-queries.
+    """
+    ranked_lists = []
+    for kind, text in queries:
+        for answers in by_source:
+            results = answers.get(text)
+            if results is None:
+                continue
+            if kind != "goal":
+                results = [resource for resource in results if not resource.get("placeholder")]
+            if results:
+                ranked_lists.append((QUERY_WEIGHTS[kind], results))
+    return ranked_lists
+
+
+def _collect(
+    submitted: List[Tuple[int, List[str], Future]],
+    n_sources: int,
+    deadline_ms: float
+) -> List[Dict[str, Sequence[Dict[str, Any]]]]:
+    """
+    Waits once, up to the deadline, for (source index, texts, future of their
+    result lists) jobs. Returns text -> results per source for the jobs that
+    finished; the rest are cancelled and dropped.
+    """
+    done, _ = wait([future for _, _, future in submitted], timeout=deadline_ms / 1000)
+    by_source: List[Dict[str, Sequence[Dict[str, Any]]]] = [{} for _ in range(n_sources)]
+    for source, texts, future in submitted:
+        if future not in done:
+            future.cancel()
+            metrics.RETRIEVAL_QUERIES.labels(outcome="timeout").inc(len(texts))
+            continue
+        try:
+            batch = future.result()
+            metrics.RETRIEVAL_QUERIES.labels(outcome="ok").inc(len(texts))
+        except Exception as e:
+            failed = f"Query for {texts[0]!r}" if len(texts) == 1 else f"Batch of {len(texts)} queries"
+            print(f"[Retrieval] {failed} failed: {e}")
+            metrics.RETRIEVAL_QUERIES.labels(outcome="error").inc(len(texts))
+            continue
+        by_source[source].update(zip(texts, batch))
+    return by_source
+
+
+def fan_out(
+    queries: List[Tuple[str, str]],
+    sources: List[Tuple[str, QueryFn]],
+    deadline_ms: float = RETRIEVAL_DEADLINE_MS
+) -> List[Tuple[float, Sequence[Dict[str, Any]]]]:
+    """
+    Runs every (query, source) pair concurrently and returns (weight, results) for
+    those finished by the deadline, in query order. The deadline covers the whole
+    fan-out: queries still running then are dropped (an empty list if none finished).
+    """
+    executor = get_executor()
+    texts = list(dict.fromkeys(text for _, text in queries))
+    submitted = [
+        (source, [text], executor.submit(_one_by_one(query_fn), [text]))
+        for text in texts for source, (_, query_fn) in enumerate(sources)
+    ]
+    return _ranked_lists(queries, _collect(submitted, len(sources), deadline_ms))
+
+
+def fan_out_batch(
+    queries_per_request: List[List[Tuple[str, str]]],
+    sources: List[Tuple[str, BatchQueryFn]],
+    deadline_ms: float = RETRIEVAL_DEADLINE_MS
+) -> List[List[Tuple[float, Sequence[Dict[str, Any]]]]]:
+    """
+    fan_out for several requests at once: each source gets one batched call with
+    the distinct query texts of all requests, under a single deadline. Returns
+    the (weight, results) lists of each request, as fan_out would.
+    """
+    executor = get_executor()
+    texts = list(dict.fromkeys(text for queries in queries_per_request for _, text in queries))
+    submitted = [
+        (source, texts, executor.submit(batch_fn, texts)) for source, (_, batch_fn) in enumerate(sources)
+    ] if texts else []
+    by_source = _collect(submitted, len(sources), deadline_ms)
+    return [_ranked_lists(queries, by_source) for queries in queries_per_request]
+
+
+def retrieve(goal: str, current_skills: List[str], prerequisites: List[str]) -> List[Dict[str, Any]]:
+    """Fan-out retrieval for a request, fused into the top RETRIEVAL_TOP_K resources."""
+    ranked_lists = fan_out(build_queries(goal, current_skills, prerequisites), get_sources())
+    return reciprocal_rank_fusion(ranked_lists, limit=RETRIEVAL_TOP_K)
+
+
+def retrieve_batch(requests: List[Tuple[str, List[str], List[str]]]) -> List[List[Dict[str, Any]]]:
+    """retrieve for each (goal, current skills, prerequisites), with batched source calls."""
+    queries_per_request = [build_queries(goal, skills, prerequisites) for goal, skills, prerequisites in requests]
+    return [
+        reciprocal_rank_fusion(ranked_lists, limit=RETRIEVAL_TOP_K)
+        for ranked_lists in fan_out_batch(queries_per_request, get_batch_sources())
+    ]
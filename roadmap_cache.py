@@ -0,0 +1,178 @@
+"""
+Two-tier result cache for roadmap generation.
+
+Near-identical requests ("React" vs "react ", skills in a different order) map
+to the same canonical key. Lookups hit an in-process LRU first and fall back to
+Redis, which is shared by the API and every worker. Keys can be scoped to an
+index generation, so roadmaps built before the retriever's data changed stop
+being served as soon as the generation is bumped.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import result_codec
+
+CacheKey = Tuple[str, Tuple[str, ...], int]
+
+
+def canonical_key(goal: str, current_skills: List[str], duration_weeks: int) -> CacheKey:
+    """
+    Normalizes a request into (goal, sorted skills, duration).
+    Case and surrounding/duplicate whitespace are ignored, as are duplicate skills.
+    """
+    norm_goal = " ".join(goal.lower().split())
+    norm_skills = tuple(sorted({" ".join(s.lower().split()) for s in current_skills if s.strip()}))
+    return (norm_goal, norm_skills, int(duration_weeks))
+
+
+def key_digest(key: CacheKey) -> str:
+    """Stable hex digest of a canonical key, usable as a Redis key suffix."""
+    return hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU with per-entry TTL (ttl_seconds=None never expires)."""
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: Optional[int] = 3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = float("inf") if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RoadmapCache:
+    """
+    In-process LRU in front of a Redis tier.
+    The Redis client is created lazily through redis_client_factory so that the
+    existing Celery result-backend connection pool can be reused. If generation
+    is given, entries are keyed under its current value (entries of older
+    generations are never read again and expire on their own).
+    """
+
+    def __init__(
+        self,
+        redis_client_factory: Optional[Callable[[], Any]] = None,
+        max_size: int = 1024,
+        ttl_seconds: int = 3600,
+        prefix: str = "roadmap:cache:",
+        generation: Optional[Callable[[], int]] = None,
+    ):
+        self.local = LRUCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self._generation = generation
+        self._redis_client_factory = redis_client_factory
+        self._redis = None
+        self._counter_lock = threading.Lock()
+        self.counters = {"local_hits": 0, "redis_hits": 0, "misses": 0, "redis_errors": 0}
+
+    def _incr(self, name: str):
+        with self._counter_lock:
+            self.counters[name] += 1
+
+    def _client(self):
+        if self._redis is None and self._redis_client_factory is not None:
+            self._redis = self._redis_client_factory()
+        return self._redis
+
+    def _key(self, goal: str, current_skills: List[str], duration_weeks: int) -> Optional[str]:
+        """Cache key (without prefix) for a request, or None if the generation can't be read."""
+        digest = key_digest(canonical_key(goal, current_skills, duration_weeks))
+        if self._generation is None:
+            return digest
+        try:
+            return f"{self._generation()}:{digest}"
+        except Exception as e:
+            print(f"[Cache] Could not read the index generation: {e}")
+            self._incr("redis_errors")
+            return None
+
+    def get(self, goal: str, current_skills: List[str], duration_weeks: int) -> Optional[Dict[str, Any]]:
+        """Returns a cached roadmap result or None."""
+        key = self._key(goal, current_skills, duration_weeks)
+        if key is None:
+            self._incr("misses")
+            return None
+
+        value = self.local.get(key)
+        if value is not None:
+            self._incr("local_hits")
+            return value
+
+        client = self._client()
+        if client is not None:
+            try:
+                raw = client.get(self.prefix + key)
+            except Exception as e:
+                print(f"[Cache] Redis lookup failed: {e}")
+                self._incr("redis_errors")
+                raw = None
+            if raw is not None:
+                value = result_codec.loads(raw)
+                self.local.set(key, value)
+                self._incr("redis_hits")
+                return value
+
+        self._incr("misses")
+        return None
+
+    def set(self, goal: str, current_skills: List[str], duration_weeks: int, value: Dict[str, Any]):
+        """Stores a roadmap result in both tiers."""
+        key = self._key(goal, current_skills, duration_weeks)
+        if key is None:
+            return
+        self.local.set(key, value)
+
+        client = self._client()
+        if client is not None:
+            try:
+                client.set(self.prefix + key, result_codec.dumps(value), ex=self.ttl_seconds)
+            except Exception as e:
+                print(f"[Cache] Redis write failed: {e}")
+                self._incr("redis_errors")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus the current local tier size."""
+        with self._counter_lock:
+            stats = dict(self.counters)
+        lookups = stats["local_hits"] + stats["redis_hits"] + stats["misses"]
+        stats["local_size"] = len(self.local)
+        stats["hit_ratio"] = (stats["local_hits"] + stats["redis_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Discrete-event simulation of the interactive queue under backpressure.
+
+Poisson arrivals (with an optional spike) feed a pool of worker slots with
+lognormal task runtimes. A simulated sampler publishes snapshots every
+--sample-interval seconds using backpressure.estimate_wait, and the real
+backpressure.AdaptiveAdmission decides admit / defer / shed for every
+arrival. Deferred tasks wait in the lowest priority band, behind admitted
+ones. Each scenario runs twice with the same seed, without and with the
+controller, so thresholds and AIMD parameters can be tuned without a cluster.
+
+Examples:
+    python simulate_backpressure.py --rate 3 --workers 4 --service-ms 1200
+    python simulate_backpressure.py --spike-rate 12 --spike-start 60 --spike-duration 60
+    python simulate_backpressure.py --target-wait 5 --max-wait 30 --decrease 0.7 --json run.json
+"""
+
+import argparse
+import heapq
+import json
+import math
+import random
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import backpressure
+import queues
+
+QUEUE = queues.INTERACTIVE_QUEUE
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile (0.0 for no values)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def service_sampler(rng: random.Random, mean: float, cv: float):
+    """Lognormal runtimes with the given mean and coefficient of variation."""
+    sigma = math.sqrt(math.log(1 + cv * cv))
+    mu = math.log(mean) - sigma * sigma / 2
+    return lambda: rng.lognormvariate(mu, sigma)
+
+
+def simulate(args, controlled: bool) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    next_service = service_sampler(random.Random(args.seed + 1), args.service_ms / 1000, args.service_cv)
+    snapshot: Optional[Dict[str, Any]] = None
+    controller = backpressure.AdaptiveAdmission(
+        lambda: snapshot,
+        target_wait={QUEUE: args.target_wait},
+        max_wait={QUEUE: args.max_wait},
+        increase=args.increase,
+        decrease=args.decrease,
+        min_fraction=args.min_fraction,
+        rng=random.Random(args.seed + 2)
+    ) if controlled else None
+
+    def arrival_rate(now: float) -> float:
+        in_spike = args.spike_start <= now < args.spike_start + args.spike_duration
+        return args.spike_rate if in_spike and args.spike_rate else args.rate
+
+    # (time, sequence, kind, payload); the sequence keeps ties in insertion order
+    events: List = []
+    sequence = 0
+
+    def schedule(at: float, kind: str, payload: Any = None):
+        nonlocal sequence
+        heapq.heappush(events, (at, sequence, kind, payload))
+        sequence += 1
+
+    bands = {queues.PRIORITY_STEPS[0]: deque(), queues.PRIORITY_STEPS[-1]: deque()}
+    busy = 0
+    # The sampler's runtime estimate starts from the configured default, like the real one
+    runtime_estimate = backpressure.DEFAULT_RUNTIME.get(QUEUE, 1.0)
+    waits = {backpressure.ADMIT: [], backpressure.DEFER: []}
+    counts = {backpressure.ADMIT: 0, backpressure.DEFER: 0, backpressure.SHED: 0}
+    max_depth = 0
+
+    def start_tasks(now: float):
+        nonlocal busy
+        while busy < args.workers:
+            band = next((b for b in bands.values() if b), None)
+            if band is None:
+                return
+            arrived_at, action = band.popleft()
+            waits[action].append(now - arrived_at)
+            busy += 1
+            runtime = next_service()
+            schedule(now + runtime, "complete", runtime)
+
+    schedule(rng.expovariate(arrival_rate(0.0)), "arrive")
+    schedule(0.0, "sample")
+    while events:
+        now, _, kind, payload = heapq.heappop(events)
+        if kind == "arrive":
+            if now < args.duration:
+                schedule(now + rng.expovariate(arrival_rate(now)), "arrive")
+            action = controller.decide(QUEUE)[0] if controller is not None else backpressure.ADMIT
+            counts[action] += 1
+            if action != backpressure.SHED:
+                band = queues.PRIORITY_STEPS[-1] if action == backpressure.DEFER else queues.PRIORITY_STEPS[0]
+                bands[band].append((now, action))
+            start_tasks(now)
+            max_depth = max(max_depth, sum(len(b) for b in bands.values()))
+        elif kind == "complete":
+            busy -= 1
+            runtime_estimate = 0.8 * runtime_estimate + 0.2 * payload
+            start_tasks(now)
+        elif kind == "sample":
+            depth = sum(len(b) for b in bands.values())
+            normal, deferred = bands[queues.PRIORITY_STEPS[0]], bands[queues.PRIORITY_STEPS[-1]]
+            runtimes = {QUEUE: runtime_estimate}
+            # Same estimates as SignalSampler.sample
+            deferred_wait = max(
+                backpressure.estimate_wait({QUEUE: depth}, runtimes, args.workers)[QUEUE],
+                now - deferred[0][0] if deferred else 0.0
+            )
+            snapshot = {"sampled_at": now, "queues": {QUEUE: {
+                "depth": depth,
+                "estimated_wait": backpressure.estimate_wait({QUEUE: len(normal)}, runtimes, args.workers)[QUEUE],
+                "deferred_wait": deferred_wait
+            }}}
+            if now < args.duration or depth:
+                schedule(now + args.sample_interval, "sample")
+
+    admitted = waits[backpressure.ADMIT]
+    served = admitted + waits[backpressure.DEFER]
+    return {
+        "controller": "adaptive" if controlled else "none",
+        "offered": sum(counts.values()),
+        **counts,
+        "max_depth": max_depth,
+        "within_target": sum(w <= args.target_wait for w in admitted) / max(len(admitted), 1),
+        "admitted_wait": {p: percentile(admitted, p) for p in (50, 95, 99)},
+        "deferred_wait": {p: percentile(waits[backpressure.DEFER], p) for p in (50, 95, 99)},
+        "all_wait": {p: percentile(served, p) for p in (50, 95, 99)}
+    }
+
+
+def print_report(results: List[Dict[str, Any]], args):
+    utilization = args.rate * args.service_ms / 1000 / args.workers
+    print(f"\nbaseline load {utilization:.0%} of {args.workers} slots; target wait {args.target_wait:g}s, "
+          f"max wait {args.max_wait:g}s")
+    print(f"{'controller':<10} {'offered':>8} {'admit':>7} {'defer':>7} {'shed':>7} {'in-target':>10} "
+          f"{'max depth':>10}  wait p50/p95/p99 (s): admitted | deferred")
+    for r in results:
+        admitted = "/".join(f"{r['admitted_wait'][p]:.1f}" for p in (50, 95, 99))
+        deferred = "/".join(f"{r['deferred_wait'][p]:.1f}" for p in (50, 95, 99)) if r["defer"] else "-"
+        print(f"{r['controller']:<10} {r['offered']:>8} {r['admit']:>7} {r['defer']:>7} {r['shed']:>7} "
+              f"{r['within_target']:>10.1%} {r['max_depth']:>10}  {admitted} | {deferred}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=3.0, help="Baseline arrivals per second")
+    parser.add_argument("--spike-rate", type=float, default=10.0, help="Arrivals per second during the spike (0: none)")
+    parser.add_argument("--spike-start", type=float, default=60.0)
+    parser.add_argument("--spike-duration", type=float, default=60.0)
+    parser.add_argument("--duration", type=float, default=300.0, help="Seconds of arrivals")
+    parser.add_argument("--workers", type=int, default=4, help="Worker pool slots")
+    parser.add_argument("--service-ms", type=float, default=1200.0, help="Mean task runtime")
+    parser.add_argument("--service-cv", type=float, default=0.5, help="Runtime coefficient of variation")
+    parser.add_argument("--sample-interval", type=float, default=backpressure.SAMPLE_INTERVAL)
+    parser.add_argument("--target-wait", type=float, default=backpressure.TARGET_WAIT.get(QUEUE, 10.0))
+    parser.add_argument("--max-wait", type=float, default=backpressure.MAX_WAIT.get(QUEUE, 60.0))
+    parser.add_argument("--increase", type=float, default=0.1, help="Additive increase of the admitted fraction")
+    parser.add_argument("--decrease", type=float, default=0.5, help="Multiplicative decrease of the admitted fraction")
+    parser.add_argument("--min-fraction", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    results = [simulate(args, controlled=False), simulate(args, controlled=True)]
+    print_report(results, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Single-flight coalescing of identical roadmap jobs.
+
+The first request for a canonical key claims it in Redis with the id of the
+task it is about to publish; identical requests arriving while that task is in
+flight attach to the same task id instead of publishing their own. Every
+caller (owner or attached) gets a reader token for the shared result, and the
+result is only expired early once every token has collected it.
+"""
+
+import uuid
+from typing import Any, Callable, Optional
+
+INFLIGHT_PREFIX = "roadmap:inflight:"
+READERS_PREFIX = "roadmap:readers:"
+
+# Delete the in-flight key only if it still points at our task
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Count one reader out (only on its token's first fetch); expire the result to
+# the grace period after the last one
+_COLLECTED_SCRIPT = """
+if redis.call('SREM', KEYS[1], ARGV[1]) == 0 then
+    return -1
+end
+local remaining = redis.call('SCARD', KEYS[1])
+if remaining == 0 then
+    redis.call('EXPIRE', KEYS[2], ARGV[2])
+end
+return remaining
+"""
+
+
+def new_reader() -> str:
+    """A reader token, handed to the client with the task id and sent back when polling."""
+    return uuid.uuid4().hex
+
+
+class SingleFlight:
+    """
+    Redis registry of in-flight roadmap tasks keyed by canonical request digest.
+    Redis errors degrade to no coalescing: callers then publish their own task.
+    """
+
+    def __init__(
+        self,
+        redis_client_factory: Callable[[], Any],
+        result_key: Callable[[str], Any],
+        inflight_ttl: int = 300,
+        result_ttl: int = 3600,
+        result_grace: int = 60
+    ):
+        self._redis_client_factory = redis_client_factory
+        self._redis = None
+        self._result_key = result_key
+        self.inflight_ttl = inflight_ttl
+        self.result_ttl = result_ttl
+        self.result_grace = result_grace
+
+    def _client(self):
+        if self._redis is None:
+            self._redis = self._redis_client_factory()
+        return self._redis
+
+    def _add_reader(self, task_id: str, reader: str):
+        pipe = self._client().pipeline()
+        pipe.sadd(READERS_PREFIX + task_id, reader)
+        pipe.expire(READERS_PREFIX + task_id, self.result_ttl)
+        pipe.execute()
+
+    def attach(self, digest: str, reader: str) -> Optional[str]:
+        """Id of the task in flight for digest, registering reader on its result; else None."""
+        try:
+            existing = self._client().get(INFLIGHT_PREFIX + digest)
+            if existing is None:
+                return None
+            existing = existing.decode() if isinstance(existing, bytes) else existing
+            self._add_reader(existing, reader)
+            return existing
+        except Exception as e:
+            print(f"[SingleFlight] Attach failed, not coalescing: {e}")
+            return None
+
+    def claim(self, digest: str, task_id: str, reader: str) -> Optional[str]:
+        """
+        Claims the key for task_id. Returns None if the caller now owns it (and must
+        publish task_id, or abandon() the claim), or the id of the task already in
+        flight, with reader registered on it.
+        """
+        try:
+            if self._client().set(INFLIGHT_PREFIX + digest, task_id, nx=True, ex=self.inflight_ttl):
+                self._add_reader(task_id, reader)
+                return None
+        except Exception as e:
+            print(f"[SingleFlight] Claim failed, not coalescing: {e}")
+            return None
+        # Lost the race; if the winner already finished its result is cached and we just run again
+        return self.attach(digest, reader)
+
+    def finish(self, digest: str, task_id: str):
+        """Called by the task once its result is stored; later requests hit the result cache."""
+        try:
+            self._client().eval(_RELEASE_SCRIPT, 1, INFLIGHT_PREFIX + digest, task_id)
+        except Exception as e:
+            print(f"[SingleFlight] Release failed for {task_id}: {e}")
+
+    def abandon(self, digest: str, task_id: str):
+        """Releases a claim whose task could not be published, so duplicates don't attach to it."""
+        self.finish(digest, task_id)
+        try:
+            self._client().delete(READERS_PREFIX + task_id)
+        except Exception as e:
+            print(f"[SingleFlight] Reader cleanup failed for {task_id}: {e}")
+
+    def collected(self, task_id: str, reader: str):
+        """
+        Called when a reader has fetched the finished result; repeated fetches with
+        the same token are no-ops. Once every reader has, the result is kept only
+        for result_grace seconds instead of the full result_ttl. Tasks that were
+        never claimed, and polls without a token, keep the full retention.
+        """
+        try:
+            self._client().eval(
+                _COLLECTED_SCRIPT, 2, READERS_PREFIX + task_id, self._result_key(task_id), reader, self.result_grace
+            )
+        except Exception as e:
+            print(f"[SingleFlight] Reader release failed for {task_id}: {e}")
@@ -0,0 +1,95 @@
+"""
+Task progress events over Redis pub/sub.
+
+Workers publish one event per completed agent node plus a terminal
+"completed"/"failed" event on a per-task channel. The API relays them to
+clients as Server-Sent Events instead of having them poll /tasks/{task_id}.
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+CHANNEL_PREFIX = "roadmap:events:"
+TERMINAL_EVENTS = ("completed", "failed")
+
+_async_redis = None
+
+
+def channel_for(task_id: str) -> str:
+    """Pub/sub channel for a task's events."""
+    return CHANNEL_PREFIX + task_id
+
+
+def encode_event(event: str, data: Any) -> str:
+    return json.dumps({"event": event, "data": data})
+
+
+def publish_event(redis_client, task_id: str, event: str, data: Any = None):
+    """
+    Publishes an event for task_id. Failures are logged and swallowed:
+    progress events are best-effort and must never fail the task itself.
+    """
+    try:
+        redis_client.publish(channel_for(task_id), encode_event(event, data))
+    except Exception as e:
+        print(f"[Events] Failed to publish '{event}' for task {task_id}: {e}")
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Formats a single Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def get_async_redis():
+    """Get or create the asyncio Redis client used by the API for subscriptions."""
+    global _async_redis
+    if _async_redis is None:
+        import redis.asyncio as aioredis
+        url = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
+        _async_redis = aioredis.from_url(url)
+    return _async_redis
+
+
+async def subscribe(
+    task_id: str,
+    timeout: float = 300.0,
+    keepalive: float = 15.0,
+    current_state: Optional[Callable[[], Optional[Dict[str, Any]]]] = None,
+) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """
+    Yields decoded events for task_id until a terminal event arrives or timeout
+    elapses. Yields None every `keepalive` seconds without events so callers can
+    send SSE comments and notice disconnected clients.
+
+    current_state (a blocking callable, run in the default executor) is called
+    after subscribing and on every idle keepalive tick; if it returns a terminal
+    event (the task finished before we subscribed, or its event was missed) that
+    event is yielded and the stream ends.
+    """
+    pubsub = get_async_redis().pubsub()
+    await pubsub.subscribe(channel_for(task_id))
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    try:
+        check_state = current_state is not None
+        while loop.time() < deadline:
+            if check_state:
+                # A blocking backend read (e.g. AsyncResult.state); keep it off the event loop
+                event = await loop.run_in_executor(None, current_state)
+                if event is not None:
+                    yield event
+                    return
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=keepalive)
+            check_state = message is None and current_state is not None
+            if message is None:
+                yield None
+                continue
+            event = json.loads(message["data"])
+            yield event
+            if event["event"] in TERMINAL_EVENTS:
+                return
+    finally:
+        await pubsub.unsubscribe(channel_for(task_id))
+        await pubsub.close()
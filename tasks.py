@@ -1,44 +1,358 @@
 import os
 import time
-from celery import Celery
-from typing import List, Dict, Any
+import orjson
+from celery import Celery, Task
+from kombu.serialization import register
+from celery.signals import worker_process_init, worker_init, before_task_publish, task_success
+from typing import List, Dict, Any, Optional
 # import rag_service
 import rag_service_mock as rag_service  # Use mock for quick testing
 import agent
+import roadmap_cache
+import task_events
+import metrics
+import queues
+import result_codec
+import single_flight
+import materialized
+import retrieval
 
 # Configure Celery
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
+ROADMAP_CACHE_SIZE = int(os.getenv("ROADMAP_CACHE_SIZE", "1024"))
+ROADMAP_CACHE_TTL = int(os.getenv("ROADMAP_CACHE_TTL", "3600"))
+ROADMAP_RESULT_EXPIRES = int(os.getenv("ROADMAP_RESULT_EXPIRES", "3600"))
+BATCH_RESULT_EXPIRES = int(os.getenv("BATCH_RESULT_EXPIRES", "86400"))
+MAINTENANCE_RESULT_EXPIRES = int(os.getenv("MAINTENANCE_RESULT_EXPIRES", "600"))
+SINGLE_FLIGHT_TTL = int(os.getenv("SINGLE_FLIGHT_TTL", "300"))
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9808"))
+STREAM_STATE_INTERVAL = float(os.getenv("STREAM_STATE_INTERVAL_MS", "100")) / 1000
+WORKER_PRELOAD = os.getenv("WORKER_PRELOAD", "true").lower() == "true"
+MATERIALIZE_TOP_N = int(os.getenv("MATERIALIZE_TOP_N", "50"))
+MATERIALIZE_INTERVAL = int(os.getenv("MATERIALIZE_INTERVAL", "600"))
+MATERIALIZED_TTL = int(os.getenv("MATERIALIZED_TTL", "86400"))
+POPULARITY_WINDOW_HOURS = int(os.getenv("POPULARITY_WINDOW_HOURS", "24"))
+WORKER_TASK_EVENTS = os.getenv("WORKER_TASK_EVENTS", "true").lower() == "true"
+
+
+class InstrumentedTask(Task):
+    """
+    Task base class recording queue wait and runtime for every task.
+    result_ttl overrides result_expires for the task's stored result (see apply_result_ttl).
+    """
+
+    result_ttl: Optional[int] = None
+
+    def __call__(self, *args, **kwargs):
+        enqueued_at = getattr(self.request, "enqueued_at", None)
+        if enqueued_at is not None:
+            metrics.QUEUE_WAIT.labels(task=self.name).observe(max(time.time() - enqueued_at, 0.0))
+        start = time.perf_counter()
+        try:
+            return super().__call__(*args, **kwargs)
+        finally:
+            # The result is stored right after __call__ returns; see record_backend_write
+            self.request.returned_at = time.perf_counter()
+            metrics.TASK_RUNTIME.labels(task=self.name).observe(self.request.returned_at - start)
+
+
+# orjson for messages; results use the compact roadmap codec (dictionary-encoded, zstd)
+register("orjson", orjson.dumps, orjson.loads, content_type="application/x-orjson", content_encoding="binary")
+register(
+    "roadmap", result_codec.dumps, result_codec.loads,
+    content_type=result_codec.CONTENT_TYPE, content_encoding="binary"
+)
 
 celery_app = Celery(
     "tasks",
     broker=CELERY_BROKER_URL,
-    backend=CELERY_RESULT_BACKEND
+    backend=CELERY_RESULT_BACKEND,
+    task_cls=InstrumentedTask
+)
+celery_app.conf.update(
+    task_serializer="orjson",
+    result_serializer="roadmap",
+    accept_content=["orjson", "json"],
+    result_accept_content=["roadmap", "orjson", "json"],
+    result_expires=ROADMAP_RESULT_EXPIRES,
+    # Separate interactive/bulk/maintenance queues, polled by weight (QUEUE_WEIGHTS)
+    task_routes=queues.TASK_ROUTES,
+    task_default_queue=queues.INTERACTIVE_QUEUE,
+    broker_transport_options={
+        "queue_order_strategy": "queues:WeightedQueueCycle",
+        "priority_steps": queues.PRIORITY_STEPS
+    },
+    # Reserve one message at a time so priorities and queue weights apply to every dequeue
+    worker_prefetch_multiplier=1,
+    # Task runtimes for the backpressure sampler (backpressure.py)
+    worker_send_task_events=WORKER_TASK_EVENTS,
+    # Run by `celery beat`; refreshes precomputed roadmaps for the most requested goals
+    beat_schedule={
+        "materialize-popular-roadmaps": {
+            "task": "materialize_popular_roadmaps",
+            "schedule": MATERIALIZE_INTERVAL
+        }
+    }
+)
+
+@before_task_publish.connect
+def stamp_enqueue_time(headers=None, **kwargs):
+    """Stamp publish time into message headers so workers can measure queue wait."""
+    if headers is not None:
+        headers.setdefault("enqueued_at", time.time())
+
+@task_success.connect
+def record_backend_write(sender=None, **kwargs):
+    """task_success fires after the result is stored, so this measures the backend write."""
+    returned_at = getattr(sender.request, "returned_at", None)
+    if returned_at is not None:
+        metrics.RESULT_BACKEND_WRITE.labels(task=sender.name).observe(time.perf_counter() - returned_at)
+
+@task_success.connect
+def apply_result_ttl(sender=None, **kwargs):
+    """Re-expires a stored result with its task's result_ttl (the backend applies result_expires)."""
+    if sender.result_ttl is None or sender.request.is_eager or sender.request.ignore_result:
+        return
+    set_result_ttl(celery_app.backend.get_key_for_task(sender.request.id), sender.result_ttl)
+
+def set_result_ttl(key: bytes, ttl: int):
+    """Sets the expiry of a result-backend key. Best-effort: the global expiry still applies."""
+    try:
+        celery_app.backend.client.expire(key, ttl)
+    except Exception as e:
+        print(f"[Tasks] Could not set result TTL: {e}")
+
+def _retrieval_modules() -> List[Any]:
+    """The retriever this worker builds plus every source in RETRIEVAL_SOURCES, each once."""
+    return list(dict.fromkeys([rag_service, *retrieval.get_source_modules()]))
+
+@worker_init.connect
+def start_worker_metrics(**kwargs):
+    """Serve worker metrics from a sidecar port in the worker's main process."""
+    metrics.start_metrics_server(WORKER_METRICS_PORT)
+
+# Roadmap result cache; the Redis tier shares the result backend's connection pool
+result_cache = roadmap_cache.RoadmapCache(
+    redis_client_factory=lambda: celery_app.backend.client,
+    max_size=ROADMAP_CACHE_SIZE,
+    ttl_seconds=ROADMAP_CACHE_TTL,
+    # Shares the precomputed roadmaps' index generation: an ingest retires both
+    generation=lambda: materialized_roadmaps.generation()
 )
 
+# Coalesces identical in-flight roadmap tasks; shares the result backend's Redis
+inflight = single_flight.SingleFlight(
+    redis_client_factory=lambda: celery_app.backend.client,
+    result_key=lambda task_id: celery_app.backend.get_key_for_task(task_id),
+    inflight_ttl=SINGLE_FLIGHT_TTL,
+    result_ttl=ROADMAP_RESULT_EXPIRES
+)
+
+# Request popularity (recorded by the API) and the roadmaps precomputed for the top requests
+popularity = materialized.PopularityTracker(
+    redis_client_factory=lambda: celery_app.backend.client,
+    window_hours=POPULARITY_WINDOW_HOURS
+)
+materialized_roadmaps = materialized.MaterializedRoadmaps(
+    redis_client_factory=lambda: celery_app.backend.client,
+    ttl_seconds=MATERIALIZED_TTL
+)
+
+@worker_init.connect
+def preload_before_fork(**kwargs):
+    """
+    Load the retriever (embedding model or keyword index) and compile the agent
+    graph in the worker's main process, before the pool forks: children inherit
+    them copy-on-write instead of each paying the import and load.
+    """
+    if not WORKER_PRELOAD:
+        return
+    start = time.perf_counter()
+    # Every retriever the fan-out queries, not just the one this worker builds
+    for source in _retrieval_modules():
+        if hasattr(source, "preload"):
+            source.preload()
+    agent.warm_graph_registry()
+    print(f"[Worker] Preloaded retrievers and agent graph in {time.perf_counter() - start:.2f}s")
+
+@worker_process_init.connect
+def warm_agent_graph(**kwargs):
+    """Compile the LangGraph workflow once per worker process (a no-op after preload)."""
+    agent.warm_graph_registry()
+
 # Initialize the RAG index when the worker starts
-@celery_app.task(bind=True)
-def initialize_rag_index(self):
-    """Initialize the RAG index on worker startup."""
+@celery_app.task(bind=True, result_ttl=MAINTENANCE_RESULT_EXPIRES)
+def initialize_rag_index(self, force_reload: bool = False):
+    """Initialize the RAG index on worker startup (force_reload re-ingests everything)."""
     try:
-        rag_service.build_sample_index()
-        return {"status": "success", "message": "RAG index initialized"}
+        stats = rag_service.build_sample_index(force_reload=force_reload)
+        return {"status": "success", "message": "RAG index initialized", "stats": stats}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
-@celery_app.task(name="generate_roadmap_task")
-def generate_roadmap_task(goal: str, duration_weeks: int, current_skills: List[str]) -> Dict[str, Any]:
+@celery_app.task(name="materialize_popular_roadmaps", result_ttl=MAINTENANCE_RESULT_EXPIRES)
+def materialize_popular_roadmaps(top_n: int = MATERIALIZE_TOP_N) -> Dict[str, int]:
+    """
+    Precomputes roadmaps for the top_n most requested goals of the popularity
+    window. Requests already materialized in the current generation only have
+    their TTL extended, so a refresh after an invalidation regenerates everything
+    and a routine refresh only generates newly popular requests.
+    """
+    generation = materialized_roadmaps.generation(refresh=True)
+    counts = {"generation": generation, "generated": 0, "kept": 0, "failed": 0}
+    for request in popularity.top(top_n):
+        goal, current_skills, duration_weeks = request["goal"], request["current_skills"], request["duration_weeks"]
+        if materialized_roadmaps.touch(generation, goal, current_skills, duration_weeks):
+            counts["kept"] += 1
+            continue
+        try:
+            result = agent.generate_roadmap_with_agent(
+                goal=goal,
+                duration_weeks=duration_weeks,
+                current_skills=current_skills
+            )
+        except Exception as e:
+            print(f"[Materialized] Could not generate roadmap for '{goal}': {e}")
+            counts["failed"] += 1
+            continue
+        materialized_roadmaps.put(generation, goal, current_skills, duration_weeks, result)
+        counts["generated"] += 1
+    print(f"[Materialized] Refreshed generation {generation}: {counts}")
+    return counts
+
+def _invalidate_materialized(stats: Dict[str, int]):
+    """Index changed: retire precomputed roadmaps and rebuild them against the new data."""
+    try:
+        materialized_roadmaps.invalidate()
+        materialize_popular_roadmaps.delay()
+    except Exception as e:
+        print(f"[Materialized] Could not invalidate precomputed roadmaps: {e}")
+
+# Any retriever feeding roadmaps can change them, not just the one this worker builds
+for _source in _retrieval_modules():
+    if hasattr(_source, "add_index_listener"):
+        _source.add_index_listener(_invalidate_materialized)
+
+def _node_progress(node_name: str, state: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact per-node progress payload for streaming clients."""
+    progress: Dict[str, Any] = {"node": node_name}
+    if node_name == "retrieve_resources":
+        progress["resources"] = len(state["retrieved_resources"])
+    elif node_name == "reason_prerequisites":
+        progress["prerequisites"] = state["prerequisites"]
+    elif node_name == "generate_timeline":
+        progress["weeks"] = len(state["roadmap"])
+    return progress
+
+@celery_app.task(name="generate_roadmap_batch_task", result_ttl=BATCH_RESULT_EXPIRES)
+def generate_roadmap_batch_task(requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Generates roadmaps for a chunk of requests in one task.
+    Identical (canonicalized) requests are computed once. Retrieval for every
+    distinct (goal, current skills) runs together: each source gets one batched
+    call for the whole chunk, and results are fused per request as for single
+    requests, so both paths cache the same roadmap for a key.
+    Returns one result per input request, in order.
+    """
+    keys = [
+        roadmap_cache.canonical_key(r["goal"], r["current_skills"], r["duration_weeks"])
+        for r in requests
+    ]
+    
+    results: Dict[Any, Dict[str, Any]] = {}
+    pending: Dict[Any, Dict[str, Any]] = {}
+    for key, request in zip(keys, requests):
+        if key in results or key in pending:
+            continue
+        cached = result_cache.get(request["goal"], request["current_skills"], request["duration_weeks"])
+        if cached is not None:
+            results[key] = cached
+        else:
+            pending[key] = request
+    
+    # One retrieval per distinct normalized (goal, skills); durations share it
+    distinct: Dict[Any, Dict[str, Any]] = {}
+    for key, request in pending.items():
+        distinct.setdefault(key[:2], request)
+    fused = agent.retrieve_resources_batch([(r["goal"], r["current_skills"]) for r in distinct.values()])
+    resources = dict(zip(distinct, fused))
+    
+    for key, request in pending.items():
+        result = agent.generate_roadmap_with_agent(
+            goal=request["goal"],
+            duration_weeks=request["duration_weeks"],
+            current_skills=request["current_skills"],
+            retrieved_resources=resources[key[:2]]
+        )
+        result_cache.set(request["goal"], request["current_skills"], request["duration_weeks"], result)
+        results[key] = result
+    
+    return [results[key] for key in keys]
+
+@celery_app.task(name="generate_roadmap_task", bind=True)
+def generate_roadmap_task(self, goal: str, duration_weeks: int, current_skills: List[str]) -> Dict[str, Any]:
     """
     Background task to generate the roadmap using LangGraph agent.
+    Publishes per-node progress, each roadmap week and the final result on the task's
+    event channel. While running, the task state is PROGRESS with the weeks built so
+    far (written at most every STREAM_STATE_INTERVAL_MS, plus once per node).
+    The task may be shared by coalesced duplicate requests (see single_flight);
+    its in-flight claim is released once the result is cached.
     """
+    redis_client = celery_app.backend.client
+    task_id = self.request.id
+    digest = roadmap_cache.key_digest(roadmap_cache.canonical_key(goal, current_skills, duration_weeks))
+    
     # Simulate some processing time
     time.sleep(1)
     
-    # Use the LangGraph agent to generate the roadmap
-    result = agent.generate_roadmap_with_agent(
-        goal=goal,
-        duration_weeks=duration_weeks,
-        current_skills=current_skills
-    )
+    # Partial roadmap, mirrored into the PROGRESS task state as weeks are built
+    weeks: List[Dict[str, Any]] = []
+    last_state_update = 0.0
+
+    def update_progress(node: Optional[str], force: bool):
+        nonlocal last_state_update
+        now = time.monotonic()
+        if not force and now - last_state_update < STREAM_STATE_INTERVAL:
+            return
+        last_state_update = now
+        try:
+            self.update_state(state="PROGRESS", meta={
+                "node": node,
+                "partial": {"roadmap": list(weeks), "total_weeks": duration_weeks}
+            })
+        except Exception as e:
+            # Progress is best-effort, like the event channel
+            print(f"[Tasks] Could not store progress for task {task_id}: {e}")
+
+    def on_node(node: str, state: Dict[str, Any]):
+        task_events.publish_event(redis_client, task_id, "progress", _node_progress(node, state))
+        if node != "generate_timeline":
+            update_progress(node, force=True)
+
+    def on_week(week: Dict[str, Any]):
+        weeks.append(week)
+        task_events.publish_event(redis_client, task_id, "week", week)
+        # The first week is stored right away so clients can render it
+        update_progress("generate_timeline", force=len(weeks) == 1)
+    
+    try:
+        # Use the LangGraph agent to generate the roadmap, streaming nodes and weeks
+        result = agent.generate_roadmap_with_agent(
+            goal=goal,
+            duration_weeks=duration_weeks,
+            current_skills=current_skills,
+            progress_callback=on_node,
+            week_callback=on_week
+        )
+    except Exception as e:
+        task_events.publish_event(redis_client, task_id, "failed", {"error": str(e)})
+        inflight.finish(digest, task_id)
+        raise
+    
+    result_cache.set(goal, current_skills, duration_weeks, result)
+    inflight.finish(digest, task_id)
+    task_events.publish_event(redis_client, task_id, "completed", result)
     
     return result
@@ -0,0 +1,162 @@
+import math
+import random
+import threading
+
+import pytest
+
+import backpressure
+from backpressure import ADMIT, DEFER, SHED, AdaptiveAdmission
+from benchmark import HdrHistogram
+
+QUEUE = "interactive"
+
+
+class Signals:
+    """Hand-fed snapshots; each publish is a new sample."""
+
+    def __init__(self):
+        self.snapshot = None
+        self.sampled_at = 0.0
+
+    def publish(self, estimated_wait, deferred_wait=0.0):
+        self.sampled_at += 5.0
+        self.snapshot = {"sampled_at": self.sampled_at, "queues": {QUEUE: {
+            "depth": 1, "estimated_wait": estimated_wait, "deferred_wait": deferred_wait
+        }}}
+
+    def __call__(self):
+        return self.snapshot
+
+
+@pytest.fixture
+def signals():
+    return Signals()
+
+
+@pytest.fixture
+def controller(signals):
+    return AdaptiveAdmission(
+        signals, target_wait={QUEUE: 10.0}, max_wait={QUEUE: 60.0},
+        increase=0.1, decrease=0.5, min_fraction=0.05, rng=random.Random(1)
+    )
+
+
+def test_admits_everything_without_signals(controller):
+    assert controller.decide(QUEUE) == (ADMIT, 0.0)
+    assert controller.fractions == {}
+
+
+def test_aimd_halves_over_target_and_recovers_additively(controller, signals):
+    fractions = []
+    for wait in [20, 20, 20, 5, 5, 5]:
+        signals.publish(wait)
+        controller.decide(QUEUE)
+        fractions.append(controller.fractions[QUEUE])
+    assert fractions == pytest.approx([0.5, 0.25, 0.125, 0.225, 0.325, 0.425])
+
+
+def test_one_aimd_step_per_snapshot(controller, signals):
+    signals.publish(20)
+    for _ in range(50):
+        controller.decide(QUEUE)
+    assert controller.fractions[QUEUE] == 0.5
+
+
+def test_concurrent_decisions_apply_one_aimd_step_per_snapshot(controller, signals):
+    signals.publish(20, deferred_wait=30)
+    threads = [threading.Thread(target=lambda: [controller.decide(QUEUE) for _ in range(500)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert controller.fractions[QUEUE] == 0.5
+    assert controller.counters[ADMIT] + controller.counters[DEFER] == 4000
+
+def test_fraction_stays_within_bounds(controller, signals):
+    for _ in range(20):
+        signals.publish(100, deferred_wait=0)
+        controller.decide(QUEUE)
+    assert controller.fractions[QUEUE] == 0.05
+    for _ in range(20):
+        signals.publish(0)
+        controller.decide(QUEUE)
+    assert controller.fractions[QUEUE] == 1.0
+
+
+def test_starving_deferred_band_also_backs_off(controller, signals):
+    signals.publish(1, deferred_wait=120)
+    controller.decide(QUEUE)
+    assert controller.fractions[QUEUE] == 0.5
+
+
+def test_defers_the_excess_share(controller, signals):
+    signals.publish(20, deferred_wait=30)
+    actions = [controller.decide(QUEUE)[0] for _ in range(1000)]
+    assert actions.count(ADMIT) == pytest.approx(500, abs=60)
+    assert actions.count(ADMIT) + actions.count(DEFER) == 1000
+
+
+def test_sheds_when_deferred_work_would_wait_too_long(controller, signals):
+    signals.publish(100, deferred_wait=70)
+    action, retry_after = controller.decide(QUEUE)
+    assert action == SHED
+    assert retry_after == 60.0
+
+
+def test_estimate_wait_uses_the_weighted_share_of_slots():
+    waits = backpressure.estimate_wait(
+        {"interactive": 12, "bulk": 6, "maintenance": 0},
+        {"interactive": 1.0, "bulk": 2.0, "maintenance": 5.0},
+        concurrency=9,
+        weights={"interactive": 6, "bulk": 3, "maintenance": 1}
+    )
+    # interactive gets 6 of the 9 slots, bulk 3; idle maintenance takes none
+    assert waits == {"interactive": 2.0, "bulk": 4.0, "maintenance": 0.0}
+    assert backpressure.estimate_wait({"q": 1}, {"q": 1.0}, concurrency=0) == {"q": math.inf}
+
+
+def test_desired_concurrency():
+    slots = backpressure.desired_concurrency(
+        {"interactive": 20, "bulk": 0}, {"interactive": 1.5, "bulk": 10.0}, active=4,
+        target_wait={"interactive": 10.0, "bulk": 300.0}
+    )
+    assert slots == 7
+
+
+def test_hdr_percentiles_on_uniform_values():
+    histogram = HdrHistogram(significant_figures=3)
+    for value in range(1, 100001):
+        histogram.record(value)
+    for percentile in (50, 95, 99, 99.9):
+        expected = percentile * 1000
+        assert histogram.value_at_percentile(percentile) == pytest.approx(expected, rel=1e-3)
+    assert histogram.value_at_percentile(100) == 100000
+    assert histogram.min == 1
+
+
+def test_hdr_keeps_precision_at_every_magnitude():
+    histogram = HdrHistogram(significant_figures=3)
+    for value in (7, 1234, 987654, 123456789):
+        histogram.record(value)
+    assert histogram.value_at_percentile(25) == 7
+    for percentile, value in ((50, 1234), (75, 987654)):
+        assert histogram.value_at_percentile(percentile) == pytest.approx(value, rel=1e-3)
+    assert histogram.value_at_percentile(99) == 123456789
+
+
+def test_hdr_merge_matches_recording_into_one():
+    merged, left, right, single = HdrHistogram(), HdrHistogram(), HdrHistogram(), HdrHistogram()
+    rng = random.Random(7)
+    for i in range(5000):
+        value = int(rng.lognormvariate(10, 1))
+        (left if i % 2 else right).record(value)
+        single.record(value)
+    merged.merge(left)
+    merged.merge(right)
+    assert merged.summary() == single.summary()
+    assert merged.to_buckets() == single.to_buckets()
+
+
+def test_hdr_empty_summary():
+    assert HdrHistogram().summary()["p99_ms"] == 0.0
+
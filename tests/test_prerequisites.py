@@ -0,0 +1,96 @@
+import pytest
+
+import agent
+from prerequisites import PrerequisiteGraph
+from timeline import compile_timeline
+
+
+def chain(length):
+    """t0 <- t1 <- ... <- t<length>: the last topic needs every earlier one."""
+    topics = {"t0": {"name": "T0", "why": "why 0"}}
+    for i in range(1, length + 1):
+        topics[f"t{i}"] = {"name": f"T{i}", "requires": [f"t{i - 1}"], "why": f"why {i}"}
+    return PrerequisiteGraph(topics)
+
+
+def diamond():
+    # base <- left, right <- top
+    return PrerequisiteGraph({
+        "base": {"name": "Base"},
+        "left": {"name": "Left", "requires": ["base"]},
+        "right": {"name": "Right", "requires": ["base"]},
+        "top": {"name": "Top", "aliases": ["apex"], "requires": ["left", "right"]},
+    })
+
+
+def why_firsts(goal, skills, weeks=8):
+    state = agent.reason_prerequisites_node({"goal": goal, "current_skills": skills})
+    template = compile_timeline(goal, [], state["prerequisites"])
+    return [week["why_first"] for week in template.iter_weeks(weeks)]
+
+
+def test_closure_is_transitive():
+    graph = diamond()
+    ids = graph.ids
+    assert graph.closure[ids["base"]] == 0
+    assert graph.closure[ids["left"]] == 1 << ids["base"]
+    assert graph.closure[ids["top"]] == (1 << ids["base"]) | (1 << ids["left"]) | (1 << ids["right"])
+
+
+def test_missing_prerequisites_in_topological_order():
+    graph = diamond()
+    names = [graph.names[i] for i in graph.missing_prerequisites("apex", [])]
+    assert names[0] == "Base"
+    assert sorted(names[1:]) == ["Left", "Right"]
+
+
+def test_a_skill_implies_its_prerequisites():
+    graph = diamond()
+    assert [graph.names[i] for i in graph.missing_prerequisites("Top", ["Left"])] == ["Right"]
+    assert graph.missing_prerequisites("Top", ["Left", "Right"]) == []
+
+
+def test_unknown_goal():
+    assert diamond().missing_prerequisites("Cooking", []) is None
+
+
+def test_cycle_is_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        PrerequisiteGraph({
+            "a": {"requires": ["c"]},
+            "b": {"requires": ["a"]},
+            "c": {"requires": ["b"]},
+            "d": {},
+        })
+
+
+def test_unknown_requirement_is_rejected():
+    with pytest.raises(ValueError, match="unknown"):
+        PrerequisiteGraph({"a": {"requires": ["missing"]}})
+
+
+def test_shipped_graph_loads():
+    graph = PrerequisiteGraph.load()
+    assert graph.missing_prerequisites("React", ["HTML"]) is not None
+
+
+@pytest.mark.parametrize("length", [3, 4, 5])
+def test_every_prerequisite_of_a_chain_reaches_the_timeline(monkeypatch, length):
+    monkeypatch.setattr(agent, "get_prerequisite_graph", lambda: chain(length))
+    text = " ".join(why_firsts(f"T{length}", []))
+    positions = [text.index(f"T{i}") for i in range(length)]
+    assert positions == sorted(positions)
+    assert f"T{length} " not in text
+
+
+def test_react_keeps_javascript():
+    first, second = why_firsts("React", [])[:2]
+    assert "HTML" in first
+    assert "JavaScript" in second
+
+
+def test_known_skills_are_skipped(monkeypatch):
+    monkeypatch.setattr(agent, "get_prerequisite_graph", lambda: chain(3))
+    first, second = why_firsts("T3", ["T1"])[:2]
+    assert first.startswith("Learn T2 first")
+    assert "T0" not in first + second
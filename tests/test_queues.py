@@ -0,0 +1,127 @@
+from collections import Counter
+
+import pytest
+
+import admission
+import queues
+from admission import TenantAdmission, TokenBucket
+from queues import WeightedQueueCycle
+
+WEIGHTS = {"interactive": 6, "bulk": 3, "maintenance": 1}
+
+
+def serve(cycle, steps, busy=None):
+    """Queue served at each step when the queues in busy (default: all) always have work."""
+    order = []
+    for _ in range(steps):
+        queue = next(q for q in cycle.consume(len(cycle.items)) if busy is None or q in busy)
+        cycle.rotate(queue)
+        order.append(queue)
+    return order
+
+
+def test_smooth_wrr_serves_6_3_1_in_every_round():
+    cycle = WeightedQueueCycle(list(WEIGHTS), weights=WEIGHTS)
+    order = serve(cycle, 100)
+    for start in range(0, 100, 10):
+        assert Counter(order[start:start + 10]) == WEIGHTS
+
+
+def test_smooth_wrr_interleaves():
+    cycle = WeightedQueueCycle(list(WEIGHTS), weights=WEIGHTS)
+    order = serve(cycle, 10)
+    # Smooth: the heavy queue's turns are spread out instead of served back to back
+    runs = [1]
+    for previous, queue in zip(order, order[1:]):
+        runs.append(runs[-1] + 1 if queue == previous else 1)
+    assert max(runs) <= 3
+    assert order.index("bulk") < 3
+
+
+def test_idle_queue_does_not_hoard_credit():
+    cycle = WeightedQueueCycle(list(WEIGHTS), weights=WEIGHTS)
+    serve(cycle, 1000, busy={"interactive", "maintenance"})
+    assert cycle.current["bulk"] <= sum(WEIGHTS.values())
+    # Once bulk has work again it gets its share without starving the others for long
+    order = serve(cycle, 10)
+    assert order[:4].count("bulk") <= 2
+    assert Counter(serve(cycle, 100))["bulk"] == 30
+
+
+def test_update_keeps_credit_of_remaining_queues():
+    cycle = WeightedQueueCycle(list(WEIGHTS), weights=WEIGHTS)
+    serve(cycle, 3)
+    credit = cycle.current["bulk"]
+    cycle.update(["bulk", "interactive"])
+    assert cycle.current == {"bulk": credit, "interactive": cycle.current["interactive"]}
+
+
+def test_parse_weights():
+    assert queues.parse_weights("interactive=6, bulk=3,bad,=2") == {"interactive": 6.0, "bulk": 3.0}
+
+
+def test_token_bucket_refills_at_rate_up_to_burst():
+    bucket = TokenBucket(rate=2.0, burst=4.0, now=0.0)
+    bucket.take(4.0)
+    assert bucket.wait_time(1.0, now=0.0) == pytest.approx(0.5)
+    assert bucket.wait_time(1.0, now=0.5) == 0.0
+    assert bucket.tokens == pytest.approx(1.0)
+    assert bucket.wait_time(1.0, now=100.0) == 0.0
+    assert bucket.tokens == 4.0
+
+
+def test_token_bucket_without_rate_never_refills():
+    bucket = TokenBucket(rate=0.0, burst=1.0, now=0.0)
+    bucket.take(1.0)
+    assert bucket.wait_time(1.0, now=10.0) == float("inf")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_tenant_admission_rejects_then_refills(clock):
+    limiter = TenantAdmission(rate=1.0, burst=2.0, weights={"big": 2.0})
+    assert [limiter.admit("small") for _ in range(2)] == [0.0, 0.0]
+    assert limiter.admit("small") == pytest.approx(1.0)
+    # Weighted tenants get a bigger bucket; other tenants are unaffected
+    assert [limiter.admit("big") for _ in range(4)] == [0.0] * 4
+    assert limiter.admit("big") == pytest.approx(0.5)
+    clock[0] += 1.0
+    assert limiter.admit("small") == 0.0
+    assert limiter.stats()["rejected_tenant"] == 2
+
+
+def test_oversized_request_costs_a_full_bucket(clock):
+    limiter = TenantAdmission(rate=1.0, burst=2.0)
+    assert limiter.admit("t", cost=10) == 0.0
+    assert limiter.admit("t") > 0
+
+
+def test_global_bucket_caps_all_tenants(clock):
+    limiter = TenantAdmission(rate=10.0, burst=10.0, global_rate=1.0, global_burst=2.0)
+    assert [limiter.admit(t) for t in "ab"] == [0.0, 0.0]
+    assert limiter.admit("c") > 0
+    assert limiter.stats()["rejected_global"] == 1
+
+
+def test_priority_demotes_tenants_that_drained_their_bucket(clock):
+    limiter = TenantAdmission(rate=1.0, burst=8.0)
+    assert limiter.priority("new") == queues.PRIORITY_STEPS[0]
+    for _ in range(5):
+        limiter.admit("t")
+    assert limiter.priority("t") == queues.PRIORITY_STEPS[1]
+    for _ in range(2):
+        limiter.admit("t")
+    assert limiter.priority("t") == queues.PRIORITY_STEPS[2]
+
+
+def test_background_work_is_published_below_in_share_interactive():
+    routes = queues.TASK_ROUTES
+    interactive = routes["generate_roadmap_task"]["priority"]
+    for name, route in routes.items():
+        if route["queue"] != queues.INTERACTIVE_QUEUE:
+            assert interactive < route["priority"] < queues.DEFERRED_PRIORITY, name
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+import rag_service_mock
+from conftest import ROOT
+
+
+@pytest.fixture(scope="module")
+def index():
+    return rag_service_mock.KeywordIndex(rag_service_mock._load_topics(os.path.join(ROOT, "data")))
+
+
+def first_title(index, goal):
+    results = index.search(goal)
+    return results[0]["title"] if results is not None else None
+
+
+@pytest.mark.parametrize("goal, title", [
+    # Goals the original substring lookup matched
+    ("React", "React Documentation"),
+    ("Learn React hooks", "React Documentation"),
+    ("Python for data science", "Python Docs"),
+    ("Modern JavaScript", "JavaScript Guide"),
+    # Fuzzy matches on topic names
+    ("reactjs", "React Documentation"),
+    ("python3", "Python Docs"),
+    ("javascrpt", "JavaScript Guide"),
+    # Topics from data/*.md
+    ("MERN stack", "MERN Stack Overview"),
+    ("CSS", "CSS Styling"),
+])
+def test_topic_hits(index, goal, title):
+    assert first_title(index, goal) == title
+
+
+@pytest.mark.parametrize("goal", [
+    "Learn cooking",
+    "Kubernetes for beginners",
+    "the art of baking",
+    "Vue",
+    "Node js",
+])
+def test_unrelated_goals_miss(index, goal):
+    assert index.search(goal) is None
+
+
+def test_miss_returns_placeholder_default():
+    results = rag_service_mock.query_resources("Learn cooking")
+    assert results[0]["title"] == "Resource for Learn cooking"
+    assert all(r["placeholder"] for r in results)
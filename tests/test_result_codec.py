@@ -0,0 +1,50 @@
+import orjson
+
+import result_codec
+from timeline import compile_timeline
+
+
+def roadmap(weeks=6):
+    resources = [{"title": f"Doc {i}", "snippet": f"snippet {i}"} for i in range(4)]
+    template = compile_timeline("Rust", resources, {"week_1": "Learn C first - pointers"})
+    return {"roadmap": template.render(weeks), "total_weeks": weeks}
+
+
+def test_roadmap_round_trip():
+    result = roadmap()
+    data = result_codec.dumps(result)
+    assert data.startswith(result_codec.MAGIC)
+    decoded = result_codec.loads(data)
+    # Resource tuples come back as lists
+    assert decoded == orjson.loads(orjson.dumps(result))
+
+
+def test_weeks_share_strings_and_resource_lists():
+    packed = result_codec.pack_roadmap(roadmap(10))
+    assert len(packed["s"]) == len(set(packed["s"]))
+    assert len(packed["l"]) < 10
+    unpacked = result_codec.unpack_roadmap(packed)
+    advanced = [w for w in unpacked["roadmap"] if w["topic"].startswith("Advanced")]
+    assert advanced[0]["resources"] is advanced[1]["resources"]
+
+
+def test_missing_why_first_survives():
+    result = {"roadmap": [dict(roadmap(1)["roadmap"][0], why_first=None)], "total_weeks": 1}
+    assert result_codec.loads(result_codec.dumps(result))["roadmap"][0]["why_first"] is None
+
+
+def test_nested_roadmaps_and_other_values():
+    value = {"status": "ok", "chunk": [roadmap(2), roadmap(3)], "count": 2, "none": None}
+    assert result_codec.loads(result_codec.dumps(value)) == orjson.loads(orjson.dumps(value))
+
+
+def test_reads_legacy_json_payloads():
+    result = orjson.loads(orjson.dumps(roadmap(3)))
+    assert result_codec.loads(orjson.dumps(result)) == result
+    assert result_codec.loads(orjson.dumps(result).decode()) == result
+    assert result_codec.loads(b'{"status": "error", "message": "boom"}') == {"status": "error", "message": "boom"}
+
+
+def test_smaller_than_json():
+    result = roadmap(52)
+    assert len(result_codec.dumps(result)) < len(orjson.dumps(result)) / 4
@@ -0,0 +1,52 @@
+import pytest
+
+from roadmap_cache import RoadmapCache
+
+RESULT = {"roadmap": [], "total_weeks": 4}
+
+
+class Redis:
+    """The two commands RoadmapCache uses, backed by a dict."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+@pytest.fixture
+def redis():
+    return Redis()
+
+
+def test_canonical_requests_share_an_entry(redis):
+    cache = RoadmapCache(redis_client_factory=lambda: redis)
+    cache.set("React", ["CSS", "HTML"], 4, RESULT)
+    assert cache.get(" react", ["html", "css "], 4) == RESULT
+    assert cache.get("React", [], 4) is None
+
+
+def test_bumping_the_generation_retires_entries(redis):
+    generation = [0]
+    cache = RoadmapCache(redis_client_factory=lambda: redis, generation=lambda: generation[0])
+    other = RoadmapCache(redis_client_factory=lambda: redis, generation=lambda: generation[0])
+    cache.set("React", [], 4, RESULT)
+    assert other.get("React", [], 4) == RESULT
+    generation[0] += 1
+    assert cache.get("React", [], 4) is None
+    assert other.get("React", [], 4) is None
+
+
+def test_unreadable_generation_is_a_miss(redis):
+    def generation():
+        raise ConnectionError("down")
+
+    cache = RoadmapCache(redis_client_factory=lambda: redis, generation=generation)
+    cache.set("React", [], 4, RESULT)
+    assert cache.get("React", [], 4) is None
+    assert redis.data == {}
+    assert cache.stats()["redis_errors"] == 2
@@ -0,0 +1,89 @@
+"""
+Template-based timeline generation.
+
+A roadmap has at most four distinct kinds of week (foundations, core concepts,
+advanced, final project). Their strings and resource lists depend only on the
+goal, the retrieved resources and the prerequisite reasoning, so they are
+compiled once per combination and cached. Rendering a roadmap then only fills
+in week numbers; resource tuples are shared between weeks and between
+requests instead of being re-sliced and re-formatted per week.
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+TEMPLATE_CACHE_SIZE = 4096
+
+_FINAL_RESOURCES = ("Project Guide", "Deployment Checklist", "Best Practices")
+_FIRST_FALLBACK = ("Getting Started Guide",)
+_SECOND_FALLBACK = ("Core Documentation", "Practice Exercises")
+_ADVANCED_FALLBACK = ("Advanced Tutorial", "Case Studies")
+
+
+class TimelineTemplate:
+    """Precompiled week templates for one (goal, resources, prerequisites) combination."""
+
+    __slots__ = ("first", "second", "advanced", "final")
+
+    def __init__(self, goal: str, resource_strings: Tuple[str, ...], why_week_1: Optional[str], why_week_2: Optional[str]):
+        # (topic, description, resources, why_first) per kind of week
+        self.first = (
+            "Foundations & Setup",
+            f"Setting up the environment for {goal} and learning core concepts.",
+            resource_strings[:2] if resource_strings else _FIRST_FALLBACK,
+            why_week_1 or "Establishing a strong foundation is crucial before advancing.",
+        )
+        self.second = (
+            "Core Concepts",
+            f"Deep dive into the essential concepts of {goal}.",
+            resource_strings[2:4] if len(resource_strings) > 2 else _SECOND_FALLBACK,
+            why_week_2 or "Building on the foundation with practical knowledge.",
+        )
+        self.advanced = (
+            None,
+            f"Exploring advanced features and patterns in {goal}.",
+            resource_strings[-2:] if resource_strings else _ADVANCED_FALLBACK,
+            "Progressive learning - each concept builds on previous knowledge.",
+        )
+        self.final = (
+            "Final Project & Review",
+            f"Building a capstone project to demonstrate {goal} mastery.",
+            _FINAL_RESOURCES,
+            "Applying knowledge through a real project solidifies learning and builds portfolio.",
+        )
+
+    def _kind(self, week_num: int, duration: int) -> tuple:
+        if week_num == 1:
+            return self.first
+        if week_num == 2 and duration > 2:
+            return self.second
+        if week_num == duration:
+            return self.final
+        return self.advanced
+
+    def iter_weeks(self, duration: int) -> Iterator[Dict[str, Any]]:
+        """Yields the week dicts of a `duration`-week roadmap one at a time; resource tuples are shared."""
+        for week_num in range(1, duration + 1):
+            topic, description, resources, why_first = self._kind(week_num, duration)
+            yield {
+                "week_number": week_num,
+                "topic": topic or f"Advanced Topics (Week {week_num})",
+                "description": description,
+                "resources": resources,
+                "why_first": why_first
+            }
+
+    def render(self, duration: int) -> List[Dict[str, Any]]:
+        """All week dicts for a roadmap of `duration` weeks."""
+        return list(self.iter_weeks(duration))
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _compile(goal: str, resource_strings: Tuple[str, ...], why_week_1: Optional[str], why_week_2: Optional[str]) -> TimelineTemplate:
+    return TimelineTemplate(goal, resource_strings, why_week_1, why_week_2)
+
+
+def compile_timeline(goal: str, resources: Sequence[Dict[str, Any]], prerequisites: Dict[str, str]) -> TimelineTemplate:
+    """Cached template for a goal, its retrieved resources and prerequisite reasoning."""
+    resource_strings = tuple(f"{r['title']}: {r['snippet']}" for r in resources)
+    return _compile(goal, resource_strings, prerequisites.get('week_1'), prerequisites.get('week_2'))
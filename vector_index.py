@@ -0,0 +1,178 @@
+"""
+Embedded in-process vector index.
+
+Stores the collection's embeddings as a float32 matrix on disk and memory-maps
+it read-only, so Celery prefork children share the same physical pages. Top-k
+uses squared L2 distance (Chroma's default space) computed with vectorized
+dot products; large corpora can use an IVF coarse quantizer to scan only the
+nearest `nprobe` lists.
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+QueryResult = Dict[str, List[List[Any]]]
+
+
+def _kmeans(data: np.ndarray, k: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Plain Lloyd's k-means, used to train the IVF centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _nearest(data, centroids)
+        for c in range(k):
+            members = data[assignments == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+    return centroids
+
+
+def _nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    distances = (centroids ** 2).sum(axis=1)[None, :] - 2 * data @ centroids.T
+    return distances.argmin(axis=1)
+
+
+class LocalVectorIndex:
+    """
+    Read-only top-k index over (ids, embeddings, documents, metadatas).
+    Rows are stored grouped by IVF list when a quantizer is trained; with no
+    quantizer every query is an exact brute-force scan.
+    """
+
+    def __init__(
+        self,
+        ids: List[str],
+        embeddings: np.ndarray,
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        centroids: Optional[np.ndarray] = None,
+        offsets: Optional[List[int]] = None,
+        nprobe: int = 8,
+    ):
+        self.ids = ids
+        self.embeddings = embeddings
+        self.documents = documents
+        self.metadatas = metadatas
+        self.centroids = centroids
+        self.offsets = offsets
+        self.nprobe = nprobe
+        self._norms = (np.asarray(embeddings, dtype=np.float32) ** 2).sum(axis=1) if len(ids) else np.zeros(0, np.float32)
+
+    @classmethod
+    def build(
+        cls,
+        ids: List[str],
+        embeddings,
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        ivf_threshold: int = 4096,
+        nprobe: int = 8,
+    ) -> "LocalVectorIndex":
+        """Builds an index, training an IVF quantizer when there are more than ivf_threshold rows."""
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(0, 0)
+        if len(ids) <= ivf_threshold:
+            return cls(list(ids), matrix, list(documents), list(metadatas), nprobe=nprobe)
+
+        nlist = int(np.sqrt(len(ids)))
+        centroids = _kmeans(matrix, nlist)
+        assignments = _nearest(matrix, centroids)
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.searchsorted(assignments[order], np.arange(nlist + 1)).tolist()
+        return cls(
+            [ids[i] for i in order],
+            matrix[order],
+            [documents[i] for i in order],
+            [metadatas[i] for i in order],
+            centroids=centroids,
+            offsets=offsets,
+            nprobe=nprobe,
+        )
+
+    @classmethod
+    def from_collection(cls, collection, **kwargs) -> "LocalVectorIndex":
+        """Exports a Chroma collection into a local index."""
+        data = collection.get(include=["embeddings", "documents", "metadatas"])
+        return cls.build(data["ids"], data["embeddings"], data["documents"], data["metadatas"], **kwargs)
+
+    def save(self, path: str):
+        """Writes <path>.f32 (row-major float32 matrix) and <path>.json (payload and quantizer)."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        matrix = np.ascontiguousarray(self.embeddings, dtype=np.float32)
+        meta = {
+            "dim": int(matrix.shape[1]) if matrix.ndim == 2 and len(self.ids) else 0,
+            "ids": self.ids,
+            "documents": self.documents,
+            "metadatas": self.metadatas,
+            "centroids": None if self.centroids is None else self.centroids.tolist(),
+            "offsets": self.offsets,
+        }
+        # Write to temp files and rename so readers never map a half-written index
+        matrix.tofile(f"{path}.f32.tmp")
+        with open(f"{path}.json.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(f"{path}.f32.tmp", f"{path}.f32")
+        os.replace(f"{path}.json.tmp", f"{path}.json")
+
+    @classmethod
+    def load(cls, path: str, nprobe: int = 8) -> "LocalVectorIndex":
+        """Memory-maps a saved index read-only."""
+        with open(f"{path}.json", "r") as f:
+            meta = json.load(f)
+        n, dim = len(meta["ids"]), meta["dim"]
+        if n and dim:
+            embeddings = np.memmap(f"{path}.f32", dtype=np.float32, mode="r", shape=(n, dim))
+        else:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+        centroids = None if meta["centroids"] is None else np.asarray(meta["centroids"], dtype=np.float32)
+        return cls(meta["ids"], embeddings, meta["documents"], meta["metadatas"], centroids, meta["offsets"], nprobe)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _candidates(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """Row indices in the nprobe nearest IVF lists, or None for a full scan."""
+        if self.centroids is None:
+            return None
+        distances = (self.centroids ** 2).sum(axis=1) - 2 * self.centroids @ query
+        probes = np.argsort(distances)[:self.nprobe]
+        return np.concatenate([np.arange(self.offsets[p], self.offsets[p + 1]) for p in probes])
+
+    def query(self, query_embeddings: List[List[float]], n_results: int) -> QueryResult:
+        """Top-k by squared L2 distance; same result shape as chromadb Collection.query."""
+        result: QueryResult = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if not len(self):
+            for _ in query_embeddings:
+                for field in result.values():
+                    field.append([])
+            return result
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if self.centroids is None:
+            # ||q - x||^2 = ||q||^2 - 2 q.x + ||x||^2, all queries in one matmul
+            all_distances = (queries ** 2).sum(axis=1)[:, None] - 2 * queries @ self.embeddings.T + self._norms[None, :]
+            rows_per_query = [(None, d) for d in all_distances]
+        else:
+            rows_per_query = []
+            for q in queries:
+                rows = self._candidates(q)
+                rows_per_query.append((rows, (q @ q) - 2 * self.embeddings[rows] @ q + self._norms[rows]))
+
+        for rows, distances in rows_per_query:
+            k = min(n_results, len(distances))
+            top = np.argpartition(distances, k - 1)[:k] if k else np.zeros(0, dtype=int)
+            top = top[np.argsort(distances[top])]
+            indices = top if rows is None else rows[top]
+            result["ids"].append([self.ids[i] for i in indices])
+            result["documents"].append([self.documents[i] for i in indices])
+            result["metadatas"].append([self.metadatas[i] for i in indices])
+            result["distances"].append([float(max(distances[i], 0.0)) for i in top])
+        return result
+
+    async def aquery(self, query_embeddings: List[List[float]], n_results: int, timeout: Optional[float] = None) -> QueryResult:
+        """Async-compatible query; the local search never blocks on I/O."""
+        return self.query(query_embeddings, n_results)